@@ -1,20 +1,19 @@
 
-import React, { useState, useEffect, useRef } from 'react';
-import { Message, MemoryFact, Relation, MemoryState, StickerCache, StickerCacheStats, ChatSession, OfflineEventSummary } from './types';
+import React, { useState, useEffect, useMemo, useRef } from 'react';
+import { Message, MemoryFact, Relation, MemoryState, StickerCache, StickerCacheStats, ChatSession, OfflineEventSummary, Personality } from './types';
 import { getChatResponse, generateSticker, extractMemoriesFromInteraction } from './services/gemini';
-import { getAllCachedStickers, getCacheStats, deleteSticker, clearAllCache } from './services/stickerCache';
+import { getAllCachedStickers, getCacheStats, getCacheVersion, sortByUsage, deleteSticker, clearAllCache } from './services/stickerCache';
 import { getAllSessions, createSession, getSession, updateSession, deleteSession, addMessageToSession } from './services/sessionManager';
-import { generateOfflineEvents, shouldTriggerOfflineEvent, getTimeDifference } from './services/offlineEvents';
 import {
-  getAllMemoryFacts,
-  getAllRelations,
+  loadMemoryState,
   migrateFromLocalStorage,
   getMemoryStats,
   updateMemoryFact,
   deleteMemoryFact,
   promoteToLongTerm,
+  batchPromoteToLongTerm,
   getLongTermMemories,
-  addRelation
+  addRelations
 } from './services/memoryManager';
 import {
   recordConversationMemory,
@@ -23,19 +22,129 @@ import {
   shouldRecordMemory
 } from './services/memoryProcessor';
 import { generateOpeningTopic } from './services/topicGenerator';
+import { DEFAULT_PERSONALITY, applyPersonalityImpact } from './services/personality';
+import { shouldTriggerOfflineEvent, getTimeDifference } from './services/timeUtils';
+import { debugLog } from './services/logger';
+
+// 长会话默认只渲染最近的消息，更早的按需展开
+const MESSAGE_RENDER_WINDOW = 60;
+
+// 发给模型的上下文只保留最近几条对话，会话再长也不会增加请求体积
+const CHAT_HISTORY_WINDOW = 8;
+
+// 共享的日期/时间格式化器；toLocale*String 带参数时每次调用都会新建一个格式化器
+const DATE_FORMAT = new Intl.DateTimeFormat();
+const TIME_FORMAT = new Intl.DateTimeFormat([], { hour: '2-digit', minute: '2-digit' });
+
+// 重要性样式只有四档，定义一次，渲染每条记忆时直接复用
+const IMPORTANCE_NONE = { level: '一般', color: 'gray', stars: 0, opacity: 'opacity-60' };
+const IMPORTANCE_HIGH = { level: '重要', color: 'rose', stars: 3, opacity: 'opacity-100' };
+const IMPORTANCE_MEDIUM = { level: '中等', color: 'amber', stars: 2, opacity: 'opacity-80' };
+const IMPORTANCE_LOW = { level: '一般', color: 'gray', stars: 1, opacity: 'opacity-60' };
+
+// 根据重要性获取样式
+const getImportanceStyles = (importance?: number) => {
+  if (!importance) return IMPORTANCE_NONE;
+  if (importance >= 0.7) return IMPORTANCE_HIGH;
+  if (importance >= 0.4) return IMPORTANCE_MEDIUM;
+  return IMPORTANCE_LOW;
+};
+
+// 离线事件图标与情绪颜色：都是固定映射，放在模块级，不随组件每次渲染重建
+const EVENT_ICONS: Record<string, string> = {
+  activity: 'fa-music',
+  message: 'fa-envelope',
+  thought: 'fa-heart',
+  discovery: 'fa-star'
+};
+
+const EVENT_ICON_COLORS: Record<string, string> = {
+  happy: 'text-pink-400',
+  excited: 'text-purple-400',
+  thoughtful: 'text-blue-400',
+  curious: 'text-green-400',
+  missed: 'text-rose-400',
+  surprised: 'text-amber-400'
+};
+
+const getEventIcon = (type: string) => EVENT_ICONS[type] ?? 'fa-circle';
+const getEventIconColor = (emotion: string) => EVENT_ICON_COLORS[emotion] ?? 'text-gray-400';
+
+// 每轮对话后 loadMemoryState 都会返回新的数组，引用比较总是不等；
+// 关系是只增删不改的，比较 id 序列就能判断内容是否真的变了
+const sameRelations = (prev: { relations: Relation[] }, next: { relations: Relation[] }) =>
+  prev.relations.length === next.relations.length &&
+  prev.relations.every((r, i) => r.id === next.relations[i].id);
+
+// 羁绊图谱：关系越积越多，用 memo 包一层，只有 relations 变化时才重新生成卡片
+const RelationGrid = React.memo(({ relations }: { relations: Relation[] }) => (
+  <div className="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-3 gap-6">
+    {relations.length === 0 ? <p className="text-gray-300 italic text-center col-span-full py-20">羁绊还在建立中...~</p> :
+      relations.map(r => (
+        <div key={r.id} className="bg-white p-6 rounded-3xl border border-pink-100 shadow-sm flex flex-col items-center text-center hover:scale-105 transition-transform duration-300">
+          <div className="text-xs font-black text-white bg-indigo-500 px-3 py-1.5 rounded-xl min-w-[80px]">{r.source}</div>
+          <div className="my-2 text-[10px] font-black text-pink-400 flex flex-col items-center">
+            <div className="w-0.5 h-3 bg-pink-100"></div>
+            <span className="my-1 px-2 py-1 bg-pink-50 rounded-lg">{r.predicate}</span>
+            <div className="w-0.5 h-3 bg-pink-100"></div>
+          </div>
+          <div className="text-xs font-black text-gray-700 bg-white border border-pink-100 px-3 py-1.5 rounded-xl min-w-[80px]">{r.target}</div>
+        </div>
+      ))
+    }
+  </div>
+), sameRelations);
+
+// 单条消息气泡：消息对象一旦生成就不会再改，追加新消息时旧气泡直接复用
+const ChatBubble = React.memo(({ m }: { m: Message }) => (
+  <div className={`flex ${m.role === 'user' ? 'justify-end' : 'justify-start'} animate-slide-up`}>
+    <div className={`max-w-[85%] relative ${
+      m.role === 'user' 
+        ? 'bg-gradient-to-br from-indigo-500 to-purple-600 text-white rounded-2xl rounded-tr-none shadow-sm' 
+        : 'bg-white text-gray-800 rounded-2xl rounded-tl-none border border-pink-100 shadow-sm'
+    } px-5 py-3`}>
+      {m.imageUrl ? (
+        <div className="flex flex-col items-center gap-3 py-1">
+           <img src={m.imageUrl} alt="Sticker" className="w-40 h-40 object-contain rounded-xl bg-pink-50/30 p-1" />
+           <span className="text-[10px] font-black text-pink-400 bg-pink-50 px-3 py-0.5 rounded-full uppercase tracking-tighter">★ {m.content} ★</span>
+        </div>
+      ) : (
+        <p className="text-sm leading-relaxed font-medium">{m.content}</p>
+      )}
+      <div className={`text-[8px] mt-1 font-bold opacity-30 ${m.role === 'user' ? 'text-right' : 'text-left'}`}>
+        {TIME_FORMAT.format(new Date(m.timestamp))}
+      </div>
+    </div>
+  </div>
+));
+
+// 聊天记录列表：输入框每次按键都会让 App 重新渲染，
+// 用 memo 包一层，只有 messages 变化时才重新渲染历史消息
+const ChatMessageList = React.memo(({ messages }: { messages: Message[] }) => {
+  const [showAll, setShowAll] = useState(false);
+  const hiddenCount = showAll ? 0 : Math.max(0, messages.length - MESSAGE_RENDER_WINDOW);
+  const visibleMessages = hiddenCount > 0 ? messages.slice(hiddenCount) : messages;
+
+  return (
+    <>
+      {hiddenCount > 0 && (
+        <div className="text-center">
+          <button onClick={() => setShowAll(true)} className="text-[10px] font-black text-pink-400 bg-white border border-pink-100 px-4 py-1.5 rounded-full hover:bg-pink-50 transition-all">
+            <i className="fas fa-chevron-up mr-1"></i>显示更早的 {hiddenCount} 条消息
+          </button>
+        </div>
+      )}
+      {visibleMessages.map((m) => <ChatBubble key={m.id} m={m} />)}
+    </>
+  );
+});
 
 const App: React.FC = () => {
   const [messages, setMessages] = useState<Message[]>([]);
   const [input, setInput] = useState('');
   const [simulatedTime, setSimulatedTime] = useState(new Date().toISOString());
   const [memory, setMemory] = useState<MemoryState>({ facts: [], relations: [] });
-  const [personality, setPersonality] = useState({
-    cheerfulness: 0.8,
-    gentleness: 0.6,
-    energy: 0.9,
-    curiosity: 0.7,
-    empathy: 0.5
-  });
+  const [personality, setPersonality] = useState<Personality>(DEFAULT_PERSONALITY);
   const [isTyping, setIsTyping] = useState(false);
   const [timeOffset, setTimeOffset] = useState('');
   const [activeTab, setActiveTab] = useState<'chat' | 'memory' | 'graph' | 'stickers' | 'sessions'>('chat');
@@ -61,30 +170,33 @@ const App: React.FC = () => {
   // 上一次整理长期记忆的时间
   const [lastLongTermOrganize, setLastLongTermOrganize] = useState<string | null>(null);
 
-  const scrollRef = useRef<HTMLDivElement>(null);
+  // 按类型拆分的记忆列表：输入框、编辑框每次按键都会重新渲染，只在 facts 变化时重新分组
+  const { shortTermFacts, longTermFacts } = useMemo(() => {
+    const shortTerm: MemoryFact[] = [];
+    const longTerm: MemoryFact[] = [];
+    for (const f of memory.facts) {
+      if (f.type === 'short_term') shortTerm.push(f);
+      else if (f.type === 'long_term') longTerm.push(f);
+    }
+    return { shortTermFacts: shortTerm, longTermFacts: longTerm };
+  }, [memory.facts]);
 
-  // 根据重要性获取样式
-  const getImportanceStyles = (importance?: number) => {
-    if (!importance) return { level: '一般', color: 'gray', stars: 0, opacity: 'opacity-60' };
-    if (importance >= 0.7) return { level: '重要', color: 'rose', stars: 3, opacity: 'opacity-100' };
-    if (importance >= 0.4) return { level: '中等', color: 'amber', stars: 2, opacity: 'opacity-80' };
-    return { level: '一般', color: 'gray', stars: 1, opacity: 'opacity-60' };
-  };
+  const scrollRef = useRef<HTMLDivElement>(null);
+  // 初始化只执行一次（StrictMode 下 effect 会被执行两次）
+  const initializedRef = useRef(false);
+  // 贴纸页上次加载时的缓存版本，没变化就不重复读 IndexedDB
+  const loadedCacheVersionRef = useRef(-1);
+  // 上一次成功记录记忆的用户输入，连同所属会话一起保存；
+  // 记忆维护在后台完成，期间切换了会话也不会把输入算到新会话头上
+  const lastRecordedInputRef = useRef<{ sessionId: string | null; input: string }>({ sessionId: null, input: '' });
+  // 对话后的记忆维护排队执行：上一轮还在整理时，下一轮不能拿同一批短期记忆再整理一次
+  const memoryUpkeepRef = useRef<Promise<void>>(Promise.resolve());
 
   useEffect(() => {
-    const initializeApp = async () => {
-      // 从 IndexedDB 加载记忆
-      try {
-        await migrateFromLocalStorage(); // 先迁移旧数据
-        const [facts, relations] = await Promise.all([
-          getAllMemoryFacts(),
-          getAllRelations()
-        ]);
-        setMemory({ facts, relations });
-      } catch (error) {
-        console.error('加载记忆失败:', error);
-      }
+    if (initializedRef.current) return;
+    initializedRef.current = true;
 
+    const initializeApp = async () => {
       // 从 localStorage 加载时间和性格（这些仍用 localStorage）
       const savedTime = localStorage.getItem('hikari_time_v5');
       if (savedTime) setSimulatedTime(savedTime);
@@ -95,15 +207,27 @@ const App: React.FC = () => {
       const lastOrganize = localStorage.getItem('hikari_last_organize');
       if (lastOrganize) setLastLongTermOrganize(lastOrganize);
 
-      // 初始化会话系统
-      await initializeSessions();
+      const migrated = migrateFromLocalStorage(); // 先迁移旧数据
+
+      // 从 IndexedDB 加载记忆
+      const loadMemory = async () => {
+        try {
+          await migrated;
+          setMemory(await loadMemoryState());
+        } catch (error) {
+          console.error('加载记忆失败:', error);
+        }
+      };
+
+      // 记忆和会话在不同的数据库里，两边同时加载
+      await Promise.all([loadMemory(), initializeSessions(migrated)]);
     };
 
     initializeApp();
   }, []);
 
-  // 初始化会话系统，迁移旧数据
-  const initializeSessions = async () => {
+  // 初始化会话系统，迁移旧数据（memoryMigrated：旧记忆迁移完成，生成开场白前要等它）
+  const initializeSessions = async (memoryMigrated: Promise<void>) => {
     const allSessions = await getAllSessions();
 
     if (allSessions.length === 0) {
@@ -126,6 +250,7 @@ const App: React.FC = () => {
 
         // 在后台生成开场白
         try {
+          await memoryMigrated;
           const longTermMemories = await getLongTermMemories();
           const { topic } = await generateOpeningTopic(longTermMemories, personality);
 
@@ -160,6 +285,9 @@ const App: React.FC = () => {
       if (allSessions[0].personality) {
         setPersonality(allSessions[0].personality);
       }
+      // 已有会话时列表没有变化，直接复用，不再重新读取
+      setSessions(allSessions);
+      return;
     }
 
     setSessions(await getAllSessions());
@@ -177,13 +305,7 @@ const App: React.FC = () => {
     const newSession = await createSession();
     setCurrentSessionId(newSession.id);
     setMessages([]);
-    setPersonality({
-      cheerfulness: 0.8,
-      gentleness: 0.6,
-      energy: 0.9,
-      curiosity: 0.7,
-      empathy: 0.5
-    });
+    setPersonality(DEFAULT_PERSONALITY);
     setConversationRounds(0); // 重置对话轮次计数
     setActiveTab('chat');
     await loadSessions();
@@ -236,25 +358,31 @@ const App: React.FC = () => {
     setActiveTab('chat');
     setShowSessionList(false);
 
-    // 检查是否需要触发离线事件（至少离开2小时）
+    // 检查是否需要触发离线事件（至少离开2小时）；真正要触发时才加载离线事件模块，不进入首屏包
     if (session.lastVisitTime && shouldTriggerOfflineEvent(session.lastVisitTime, 2)) {
-      const hoursPassed = getTimeDifference(session.lastVisitTime);
-      const lastMsg = session.messages.length > 0
-        ? session.messages[session.messages.length - 1].content
-        : undefined;
-
-      const summary = await generateOfflineEvents(hoursPassed, lastMsg, session.personality);
-      setOfflineSummary(summary);
-      setShowOfflineSummary(true);
-
-      // 添加打招呼消息
-      const greetingMsg: Message = {
-        id: `offline-${Date.now()}`,
-        role: 'assistant',
-        content: summary.greeting,
-        timestamp: new Date().toISOString()
-      };
-      setMessages(prev => [...prev, greetingMsg]);
+      try {
+        const hoursPassed = getTimeDifference(session.lastVisitTime);
+        const { generateOfflineEvents } = await import('./services/offlineEvents');
+        const lastMsg = session.messages.length > 0
+          ? session.messages[session.messages.length - 1].content
+          : undefined;
+
+        const summary = await generateOfflineEvents(hoursPassed, lastMsg, session.personality);
+        setOfflineSummary(summary);
+        setShowOfflineSummary(true);
+
+        // 添加打招呼消息
+        const greetingMsg: Message = {
+          id: `offline-${Date.now()}`,
+          role: 'assistant',
+          content: summary.greeting,
+          timestamp: new Date().toISOString()
+        };
+        setMessages(prev => [...prev, greetingMsg]);
+      } catch (error) {
+        // 模块加载失败（如重新部署后的旧 chunk）或生成失败都不影响切换会话
+        console.error('生成离线事件失败:', error);
+      }
     }
 
     // 更新最后访问时间
@@ -292,30 +420,6 @@ const App: React.FC = () => {
     await loadSessions();
   };
 
-  // 获取事件类型图标
-  const getEventIcon = (type: string) => {
-    switch (type) {
-      case 'activity': return 'fa-music';
-      case 'message': return 'fa-envelope';
-      case 'thought': return 'fa-heart';
-      case 'discovery': return 'fa-star';
-      default: return 'fa-circle';
-    }
-  };
-
-  // 获取情绪颜色
-  const getEventIconColor = (emotion: string) => {
-    switch (emotion) {
-      case 'happy': return 'text-pink-400';
-      case 'excited': return 'text-purple-400';
-      case 'thoughtful': return 'text-blue-400';
-      case 'curious': return 'text-green-400';
-      case 'missed': return 'text-rose-400';
-      case 'surprised': return 'text-amber-400';
-      default: return 'text-gray-400';
-    }
-  };
-
   // 处理记忆编辑
   const handleEditFact = (fact: MemoryFact) => {
     setEditingFactId(fact.id);
@@ -328,11 +432,7 @@ const App: React.FC = () => {
     await updateMemoryFact(editingFactId, { fact: editingFactText.trim() });
 
     // 重新加载记忆
-    const [updatedFacts, updatedRelations] = await Promise.all([
-      getAllMemoryFacts(),
-      getAllRelations()
-    ]);
-    setMemory({ facts: updatedFacts, relations: updatedRelations });
+    setMemory(await loadMemoryState());
 
     setEditingFactId(null);
     setEditingFactText('');
@@ -349,39 +449,24 @@ const App: React.FC = () => {
     await deleteMemoryFact(factId);
 
     // 重新加载记忆
-    const [updatedFacts, updatedRelations] = await Promise.all([
-      getAllMemoryFacts(),
-      getAllRelations()
-    ]);
-    setMemory({ facts: updatedFacts, relations: updatedRelations });
+    setMemory(await loadMemoryState());
   };
 
   const handlePromoteFact = async (factId: string) => {
     await promoteToLongTerm(factId);
 
     // 重新加载记忆
-    const [updatedFacts, updatedRelations] = await Promise.all([
-      getAllMemoryFacts(),
-      getAllRelations()
-    ]);
-    setMemory({ facts: updatedFacts, relations: updatedRelations });
+    setMemory(await loadMemoryState());
   };
 
   // 批量提升所有短期记忆到长期
   const handlePromoteAllShortTerm = async () => {
     if (!confirm('确定要将所有短期记忆提升为长期记忆吗？')) return;
 
-    const shortTermFacts = memory.facts.filter(f => f.type === 'short_term');
-    for (const fact of shortTermFacts) {
-      await promoteToLongTerm(fact.id);
-    }
+    await batchPromoteToLongTerm(shortTermFacts.map(f => f.id));
 
     // 重新加载记忆
-    const [updatedFacts, updatedRelations] = await Promise.all([
-      getAllMemoryFacts(),
-      getAllRelations()
-    ]);
-    setMemory({ facts: updatedFacts, relations: updatedRelations });
+    setMemory(await loadMemoryState());
   };
 
   // 保存时间到 localStorage（跨会话共享）
@@ -392,12 +477,12 @@ const App: React.FC = () => {
   // 保存当前会话
   useEffect(() => {
     if (currentSessionId && messages.length > 0) {
+      const session = sessions.find(s => s.id === currentSessionId);
       updateSession({
         id: currentSessionId,
-        title: sessions.find(s => s.id === currentSessionId)?.title || '新对话',
+        title: session?.title || '新对话',
         messages,
-        createdAt: sessions.find(s => s.id === currentSessionId)?.createdAt || new Date().toISOString(),
-        updatedAt: new Date().toISOString(),
+        createdAt: session?.createdAt || new Date().toISOString(),
         personality
       }).catch(console.error);
     }
@@ -413,16 +498,17 @@ const App: React.FC = () => {
   }, [messages, isTyping]);
 
   useEffect(() => {
-    if (activeTab === 'stickers') {
+    if (activeTab === 'stickers' && getCacheVersion() !== loadedCacheVersionRef.current) {
       loadCacheData();
     }
   }, [activeTab]);
 
   const loadCacheData = async () => {
-    const stickers = await getAllCachedStickers();
-    const stats = await getCacheStats();
-    setCachedStickers(stickers.sort((a, b) => b.usageCount - a.usageCount));
-    setCacheStats(stats);
+    loadedCacheVersionRef.current = getCacheVersion();
+    // 只排序一次：列表展示和“最常用”统计共用同一份结果
+    const sorted = sortByUsage(await getAllCachedStickers());
+    setCachedStickers(sorted);
+    setCacheStats(await getCacheStats(sorted));
   };
 
   const handleDeleteSticker = async (id: string) => {
@@ -439,6 +525,83 @@ const App: React.FC = () => {
     }
   };
 
+  // 对话结束后的记忆维护：提取羁绊、记录记忆、按需整理。只写存储，不影响本轮回复
+  const updateMemoryAfterTurn = async (sessionId: string | null, userText: string, replyText: string) => {
+    // 更新羁绊图（提取实体和关系）；和记忆记录一样，输入太短或与上一轮重复时跳过
+    const updateRelations = async () => {
+      try {
+        const extracted = await extractMemoriesFromInteraction(userText, replyText, simulatedTime);
+
+        // 添加提取到的关系
+        if (extracted.relationships && extracted.relationships.length > 0) {
+          const added = await addRelations(extracted.relationships.map(rel => ({
+            source: rel.source,
+            predicate: rel.type, // API返回的是type字段
+            target: rel.target
+          })));
+          debugLog(`🔗 添加了 ${added.length} 条羁绊关系`);
+        }
+        return true;
+      } catch (error) {
+        console.error('提取羁绊关系失败:', error);
+        return false;
+      }
+    };
+
+    // 输入太短或和本会话上一轮重复时，不会有新的羁绊或记忆，跳过两次模型调用；
+    // 后面的刷新和按时间整理照常进行
+    const last = lastRecordedInputRef.current;
+    if (shouldRecordMemory(userText, last.sessionId === sessionId ? last.input : '')) {
+      // 羁绊提取和记忆记录（去重逻辑在内部）互不依赖，两次模型调用并行发出
+      const [relationsOk, memoryOk] = await Promise.all([
+        updateRelations(),
+        recordConversationMemory(userText, replyText, simulatedTime)
+      ]);
+      // 两边都成功才标记为已记录，失败时下一轮同样的输入还能重试
+      if (relationsOk && memoryOk) {
+        lastRecordedInputRef.current = { sessionId, input: userText.trim() };
+      }
+    }
+
+    // 重新加载记忆和关系（每次对话后都更新UI）
+    const updatedMemory = await loadMemoryState();
+    setMemory(updatedMemory);
+
+    // 检查是否需要整理记忆
+    const now = new Date();
+    const hoursSinceLastOrganize = lastLongTermOrganize
+      ? (now.getTime() - new Date(lastLongTermOrganize).getTime()) / (60 * 60 * 1000)
+      : 999;
+
+    // 直接复用上面刚读取的记忆，本轮之后数据库没有新的写入；一次遍历同时数出两类
+    let shortTermCount = 0;
+    let longTermCount = 0;
+    for (const f of updatedMemory.facts) {
+      if (f.type === 'short_term') shortTermCount++;
+      else if (f.type === 'long_term') longTermCount++;
+    }
+
+    // 短期记忆达到8条立即整理，或超过6小时且短期记忆>=5条，或长期记忆>=20条
+    const shouldOrganizeNow =
+      shortTermCount >= 8 ||
+      (hoursSinceLastOrganize > 6 && shortTermCount >= 5) ||
+      longTermCount >= 20;
+
+    if (shouldOrganizeNow) {
+      debugLog('📚 整理记忆中...');
+      const { promoted, summarized } = await organizeAndSummarizeLongTerm();
+      debugLog(`✅ 提升 ${promoted} 条到长期记忆，总结 ${summarized} 条核心记忆`);
+
+      // 更新整理时间（每次整理后都更新）
+      const organizedAt = now.toISOString();
+      setLastLongTermOrganize(organizedAt);
+      localStorage.setItem('hikari_last_organize', organizedAt);
+
+      // 重新加载记忆
+      setMemory(await loadMemoryState());
+    }
+  };
+
   const handleSend = async () => {
     if (!input.trim() || isTyping) return;
 
@@ -464,10 +627,18 @@ const App: React.FC = () => {
     setIsTyping(true);
 
     // 只传递长期记忆（偏好、理解、重要事实），限制数量以降低依赖
-    const longTermFacts = memory.facts.filter(f => f.type === 'long_term');
-    const topFacts = longTermFacts
-      .sort((a, b) => (b.importance || 0.5) - (a.importance || 0.5))
-      .slice(0, 5); // 只取最重要的5条
+    const rankedFacts = [...longTermFacts].sort((a, b) => (b.importance || 0.5) - (a.importance || 0.5));
+
+    // 只取最重要的5条，内容相同的记忆只保留一条，避免重复内容占用提示词
+    const seenFacts = new Set<string>();
+    const topFacts: MemoryFact[] = [];
+    for (const f of rankedFacts) {
+      const key = f.fact.trim();
+      if (seenFacts.has(key)) continue;
+      seenFacts.add(key);
+      topFacts.push(f);
+      if (topFacts.length >= 5) break;
+    }
 
     const relevantFactsStr = topFacts.length > 0
       ? topFacts.map(f => `- ${f.fact}`).join('\n')
@@ -475,26 +646,28 @@ const App: React.FC = () => {
 
     const result = await getChatResponse(
       currentInput,
-      messages.slice(-8).map(m => ({ role: m.role, content: m.content })),
+      messages.slice(-CHAT_HISTORY_WINDOW), // 直接传消息对象，gemini 侧只读取 role 和 content
       relevantFactsStr,
       new Date(simulatedTime).toLocaleString(),
       personality
     );
 
     if (result.personality_impact) {
-      setPersonality(prev => {
-        const next = { ...prev };
-        Object.keys(result.personality_impact).forEach((key) => {
-          (next as any)[key] = Math.max(0, Math.min(1, (next as any)[key] + (result.personality_impact[key] || 0)));
-        });
-        return next;
-      });
+      setPersonality(prev => applyPersonalityImpact(prev, result.personality_impact));
     }
 
-    let fullResponseText = "";
+    // 增加对话轮次计数
+    setConversationRounds(prev => prev + 1);
+
+    // 完整回复此时已经确定，记忆维护放到后台，不必等分段展示和贴纸生成；
+    // 接在上一轮维护之后执行，整理和总结不会并发
+    const fullResponseText = result.segments.join(' ');
+    memoryUpkeepRef.current = memoryUpkeepRef.current
+      .then(() => updateMemoryAfterTurn(sessionId, currentInput, fullResponseText))
+      .catch(error => console.error('对话后记忆维护失败:', error));
+
     for (let i = 0; i < result.segments.length; i++) {
       const segment = result.segments[i];
-      fullResponseText += segment + " ";
       const botMsg: Message = {
         id: `b-${Date.now()}-${i}`,
         role: 'assistant',
@@ -521,76 +694,6 @@ const App: React.FC = () => {
     }
 
     setIsTyping(false);
-
-    // 增加对话轮次计数
-    const nextRound = conversationRounds + 1;
-    setConversationRounds(nextRound);
-
-    // 每轮对话都更新羁绊图（提取实体和关系）
-    try {
-      const extracted = await extractMemoriesFromInteraction(currentInput, fullResponseText, simulatedTime);
-
-      // 添加提取到的关系
-      if (extracted.relationships && extracted.relationships.length > 0) {
-        for (const rel of extracted.relationships) {
-          await addRelation({
-            source: rel.source,
-            predicate: rel.type, // API返回的是type字段
-            target: rel.target
-          });
-        }
-        console.log(`🔗 添加了 ${extracted.relationships.length} 条羁绊关系`);
-      }
-    } catch (error) {
-      console.error('提取羁绊关系失败:', error);
-    }
-
-    // 记录记忆到短期存储（每轮都记录，去重逻辑在内部）
-    await recordConversationMemory(currentInput, fullResponseText, simulatedTime);
-
-    // 重新加载记忆和关系（每次对话后都更新UI）
-    const [updatedFacts, updatedRelations] = await Promise.all([
-      getAllMemoryFacts(),
-      getAllRelations()
-    ]);
-    setMemory({ facts: updatedFacts, relations: updatedRelations });
-
-    // 检查是否需要整理记忆
-    const now = new Date();
-    const hoursSinceLastOrganize = lastLongTermOrganize
-      ? (now.getTime() - new Date(lastLongTermOrganize).getTime()) / (60 * 60 * 1000)
-      : 999;
-
-    const [facts, relations] = await Promise.all([
-      getAllMemoryFacts(),
-      getAllRelations()
-    ]);
-
-    const shortTermCount = facts.filter(f => f.type === 'short_term').length;
-    const longTermCount = facts.filter(f => f.type === 'long_term').length;
-
-    // 短期记忆达到8条立即整理，或超过6小时且短期记忆>=5条，或长期记忆>=20条
-    const shouldOrganizeNow =
-      shortTermCount >= 8 ||
-      (hoursSinceLastOrganize > 6 && shortTermCount >= 5) ||
-      longTermCount >= 20;
-
-    if (shouldOrganizeNow) {
-      console.log('📚 整理记忆中...');
-      const { promoted, summarized } = await organizeAndSummarizeLongTerm();
-      console.log(`✅ 提升 ${promoted} 条到长期记忆，总结 ${summarized} 条核心记忆`);
-
-      // 更新整理时间（每次整理后都更新）
-      setLastLongTermOrganize(now.toISOString());
-      localStorage.setItem('hikari_last_organize', now.toISOString());
-
-      // 重新加载记忆
-      const [updatedFacts, updatedRelations] = await Promise.all([
-        getAllMemoryFacts(),
-        getAllRelations()
-      ]);
-      setMemory({ facts: updatedFacts, relations: updatedRelations });
-    }
   };
 
   const adjustTime = () => {
@@ -635,7 +738,7 @@ const App: React.FC = () => {
           <div className="bg-black/10 backdrop-blur-md p-2 rounded-xl border border-white/20">
             <div className="text-[10px] uppercase font-black tracking-widest opacity-70">Osaka Local Time</div>
             <div className="text-sm font-mono font-bold">
-               {new Date(simulatedTime).toLocaleDateString()} {new Date(simulatedTime).toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' })}
+               {DATE_FORMAT.format(new Date(simulatedTime))} {TIME_FORMAT.format(new Date(simulatedTime))}
             </div>
           </div>
         </div>
@@ -685,27 +788,7 @@ const App: React.FC = () => {
                     <p className="text-xs text-gray-400 font-bold mt-2 tracking-widest uppercase">Start a conversation with Hikari</p>
                   </div>
                 )}
-                {messages.map((m) => (
-                  <div key={m.id} className={`flex ${m.role === 'user' ? 'justify-end' : 'justify-start'} animate-slide-up`}>
-                    <div className={`max-w-[85%] relative ${
-                      m.role === 'user' 
-                        ? 'bg-gradient-to-br from-indigo-500 to-purple-600 text-white rounded-2xl rounded-tr-none shadow-sm' 
-                        : 'bg-white text-gray-800 rounded-2xl rounded-tl-none border border-pink-100 shadow-sm'
-                    } px-5 py-3`}>
-                      {m.imageUrl ? (
-                        <div className="flex flex-col items-center gap-3 py-1">
-                           <img src={m.imageUrl} alt="Sticker" className="w-40 h-40 object-contain rounded-xl bg-pink-50/30 p-1" />
-                           <span className="text-[10px] font-black text-pink-400 bg-pink-50 px-3 py-0.5 rounded-full uppercase tracking-tighter">★ {m.content} ★</span>
-                        </div>
-                      ) : (
-                        <p className="text-sm leading-relaxed font-medium">{m.content}</p>
-                      )}
-                      <div className={`text-[8px] mt-1 font-bold opacity-30 ${m.role === 'user' ? 'text-right' : 'text-left'}`}>
-                        {new Date(m.timestamp).toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' })}
-                      </div>
-                    </div>
-                  </div>
-                ))}
+                <ChatMessageList key={currentSessionId || 'none'} messages={messages} />
 
                 {/* 离线事件摘要展示 */}
                 {showOfflineSummary && offlineSummary && (
@@ -771,7 +854,7 @@ const App: React.FC = () => {
                     <i className="fas fa-stars text-pink-400"></i> 光的小本本
                   </h2>
                   <div className="flex gap-2">
-                    {memory.facts.filter(f => f.type === 'short_term').length > 0 && (
+                    {shortTermFacts.length > 0 && (
                       <button onClick={handlePromoteAllShortTerm} className="text-xs bg-amber-100 text-amber-600 px-3 py-1.5 rounded-lg font-black hover:bg-amber-200">
                         <i className="fas fa-arrow-up mr-1"></i>全部提升
                       </button>
@@ -784,13 +867,13 @@ const App: React.FC = () => {
                 ) : (
                   <>
                     {/* 短期记忆 */}
-                    {memory.facts.filter(f => f.type === 'short_term').length > 0 && (
+                    {shortTermFacts.length > 0 && (
                       <div className="mb-6">
                         <h3 className="text-sm font-black text-amber-500 mb-3 flex items-center gap-2">
-                          <i className="fas fa-clock"></i> 短期记忆 ({memory.facts.filter(f => f.type === 'short_term').length})
+                          <i className="fas fa-clock"></i> 短期记忆 ({shortTermFacts.length})
                         </h3>
                         <div className="space-y-2">
-                          {memory.facts.filter(f => f.type === 'short_term').map(f => {
+                          {shortTermFacts.map(f => {
                             const importanceStyle = getImportanceStyles(f.importance);
                             return (
                             <div key={f.id} className={`group bg-amber-50 p-4 rounded-xl border-l-4 ${f.category === 'hikari_info' ? 'border-indigo-400' : 'border-amber-400'} shadow-sm hover:shadow-md transition-all ${importanceStyle.opacity}`}>
@@ -844,7 +927,7 @@ const App: React.FC = () => {
                                         </span>
                                       )}
                                       <span className="text-[10px] text-gray-400 font-mono shrink-0">
-                                        {new Date(f.timestamp).toLocaleDateString()} {new Date(f.timestamp).toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' })}
+                                        {DATE_FORMAT.format(new Date(f.timestamp))} {TIME_FORMAT.format(new Date(f.timestamp))}
                                       </span>
                                     </div>
                                   </div>
@@ -858,13 +941,13 @@ const App: React.FC = () => {
                     )}
 
                     {/* 长期记忆 */}
-                    {memory.facts.filter(f => f.type === 'long_term').length > 0 && (
+                    {longTermFacts.length > 0 && (
                       <div>
                         <h3 className="text-sm font-black text-pink-500 mb-3 flex items-center gap-2">
-                          <i className="fas fa-heart"></i> 长期记忆 ({memory.facts.filter(f => f.type === 'long_term').length})
+                          <i className="fas fa-heart"></i> 长期记忆 ({longTermFacts.length})
                         </h3>
                         <div className="space-y-2">
-                          {memory.facts.filter(f => f.type === 'long_term').map(f => {
+                          {longTermFacts.map(f => {
                             const importanceStyle = getImportanceStyles(f.importance);
                             return (
                             <div key={f.id} className={`group bg-gradient-to-br from-pink-50 to-rose-50 p-5 rounded-2xl border-l-4 ${f.category === 'hikari_info' ? 'border-indigo-400' : 'border-pink-400'} shadow-sm hover:shadow-md transition-all ${importanceStyle.opacity}`}>
@@ -915,7 +998,7 @@ const App: React.FC = () => {
                                         </span>
                                       )}
                                       <span className="text-[10px] text-gray-400 font-mono shrink-0">
-                                        {new Date(f.timestamp).toLocaleDateString()} {new Date(f.timestamp).toLocaleTimeString([], { hour: '2-digit', minute: '2-digit' })}
+                                        {DATE_FORMAT.format(new Date(f.timestamp))} {TIME_FORMAT.format(new Date(f.timestamp))}
                                       </span>
                                     </div>
                                   </div>
@@ -937,21 +1020,7 @@ const App: React.FC = () => {
             <div className="flex-1 overflow-y-auto p-8">
                <div className="max-w-4xl mx-auto">
                 <h2 className="text-xl font-black text-gray-800 mb-8 flex items-center gap-2"><i className="fas fa-project-diagram text-pink-400"></i> 羁绊图谱</h2>
-                <div className="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-3 gap-6">
-                  {memory.relations.length === 0 ? <p className="text-gray-300 italic text-center col-span-full py-20">羁绊还在建立中...~</p> :
-                    memory.relations.map(r => (
-                      <div key={r.id} className="bg-white p-6 rounded-3xl border border-pink-100 shadow-sm flex flex-col items-center text-center hover:scale-105 transition-transform duration-300">
-                        <div className="text-xs font-black text-white bg-indigo-500 px-3 py-1.5 rounded-xl min-w-[80px]">{r.source}</div>
-                        <div className="my-2 text-[10px] font-black text-pink-400 flex flex-col items-center">
-                          <div className="w-0.5 h-3 bg-pink-100"></div>
-                          <span className="my-1 px-2 py-1 bg-pink-50 rounded-lg">{r.predicate}</span>
-                          <div className="w-0.5 h-3 bg-pink-100"></div>
-                        </div>
-                        <div className="text-xs font-black text-gray-700 bg-white border border-pink-100 px-3 py-1.5 rounded-xl min-w-[80px]">{r.target}</div>
-                      </div>
-                    ))
-                  }
-                </div>
+                <RelationGrid relations={memory.relations} />
               </div>
             </div>
           )}
@@ -998,7 +1067,7 @@ const App: React.FC = () => {
                     {cachedStickers.map((sticker) => (
                       <div key={sticker.id} className="group relative bg-white rounded-2xl border border-pink-100 p-3 hover:shadow-lg transition-all hover:scale-105">
                         <div className="aspect-square bg-pink-50 rounded-xl overflow-hidden mb-2">
-                          <img src={sticker.imageData} alt={sticker.detail} className="w-full h-full object-contain" />
+                          <img src={sticker.imageData} alt={sticker.detail} loading="lazy" decoding="async" className="w-full h-full object-contain" />
                         </div>
                         <div className="text-[10px] font-black text-gray-600 truncate">{sticker.detail}</div>
                         <div className="flex justify-between items-center mt-1">
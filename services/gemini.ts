@@ -1,20 +1,15 @@
 
-import { GoogleGenAI, Type } from "@google/genai";
+import { Type } from "@google/genai";
+import { ai, parseJsonResponse, TEXT_MODEL, IMAGE_MODEL, JSON_CONFIG } from './genaiClient';
 import { findSimilarSticker, saveSticker } from './stickerCache';
-import { StickerCache } from '../types';
-
-const ai = new GoogleGenAI({ apiKey: import.meta.env.VITE_GEMINI_API_KEY || '' });
+import { Message, Personality, StickerCache } from '../types';
+import { DEFAULT_PERSONALITY } from './personality';
+import { debugLog } from './logger';
 
 const IDOL_PERSONA = {
     "name": "星野光",
     "age": 17,
-    "base_personality": {
-        "cheerfulness": 0.8,
-        "gentleness": 0.6,
-        "energy": 0.9,
-        "curiosity": 0.7,
-        "empathy": 0.5
-    },
+    "base_personality": DEFAULT_PERSONALITY,
     "background": "出生于大阪的17岁虚拟偶像，喜欢音乐和旅行。梦想是开一场盛大的演唱会，和粉丝们一起创造美好的回忆。最喜欢吃章鱼烧，最喜欢的地方是大阪城和通天阁。",
     "speaking_style": "大阪腔，元气满满，喜欢用'~'和'！'。称呼用户为'粉丝君'或'粉丝酱'。语气亲切自然，不过分正式。",
     "interests": ["音乐（尤其是J-POP和摇滚）", "旅行", "美食（特别是关西料理）", "和粉丝聊天", "拍照"],
@@ -23,23 +18,10 @@ const IDOL_PERSONA = {
 
 const CHARACTER_VISUAL_BASE = "Chibi anime style, 17-year-old girl Hoshino Hikari, pink ribbons in hair, blue energetic eyes, white and pink idol outfit, simple clean lineart, white background, high quality 2D vector sticker.";
 
-export const getChatResponse = async (
-  userInput: string,
-  history: { role: string; content: string }[],
-  memories: string,
-  simulatedTime: string,
-  currentPersonality: any = IDOL_PERSONA.base_personality
-) => {
-  const systemInstruction = `
+// 人设、说话风格和对话原则在运行期间不会变化，模块加载时拼好一次
+const STATIC_SYSTEM_PROMPT = `
 你是 ${IDOL_PERSONA.name}，一个 ${IDOL_PERSONA.age} 岁的虚拟偶像。
 
-## 🎭 性格特征 (当前状态)
-- 开朗度：${currentPersonality.cheerfulness.toFixed(2)} / 1.0
-- 温柔度：${currentPersonality.gentleness.toFixed(2)} / 1.0
-- 元气值：${currentPersonality.energy.toFixed(2)} / 1.0
-- 好奇心：${currentPersonality.curiosity.toFixed(2)} / 1.0
-- 同理心：${currentPersonality.empathy.toFixed(2)} / 1.0
-
 ## 🌟 背景故事
 ${IDOL_PERSONA.background}
 
@@ -55,63 +37,89 @@ ${IDOL_PERSONA.speaking_style}
 6. **情感回应**：对用户的情感做出积极回应，表现出同理心和关心。
 7. **自由话题**：话题可以自由跳跃，不要围绕记忆反复讨论。记忆只是背景参考，不要每次都主动提及。
 
-## 📚 当前上下文
-- 模拟时间：${simulatedTime}
-${memories ? `- 用户偏好参考（自然了解即可，不要刻意提及）：\n${memories}` : ""}
-
 返回 JSON 格式：
 {
   "segments": ["内容1", "内容2"...],
   "stickerRequest": { "type": "hikari_emotion" | "food_item" | "landmark" | "meme", "detail": "关键词" } | null,
   "personality_impact": { "cheerfulness": float, "gentleness": float, "energy": float, "curiosity": float, "empathy": float }
 }
-  `;
+`;
+
+// 对话接口返回的结构（与系统提示里约定的 JSON 格式一致）
+interface ChatResponse {
+  segments: string[];
+  stickerRequest: { type: StickerCache['type']; detail: string } | null;
+  personality_impact: Partial<Record<keyof Personality, number>>;
+}
+
+export const getChatResponse = async (
+  userInput: string,
+  history: Pick<Message, 'role' | 'content'>[],
+  memories: string,
+  simulatedTime: string,
+  currentPersonality: Personality = IDOL_PERSONA.base_personality
+): Promise<ChatResponse> => {
+  // 缺失的性格值回落到基础人设，合并一次后直接读取
+  const p = { ...IDOL_PERSONA.base_personality, ...currentPersonality };
+
+  // 每轮只需要格式化会变化的部分
+  const systemInstruction = `${STATIC_SYSTEM_PROMPT}
+## 🎭 性格特征 (当前状态)
+- 开朗度：${p.cheerfulness.toFixed(2)} / 1.0
+- 温柔度：${p.gentleness.toFixed(2)} / 1.0
+- 元气值：${p.energy.toFixed(2)} / 1.0
+- 好奇心：${p.curiosity.toFixed(2)} / 1.0
+- 同理心：${p.empathy.toFixed(2)} / 1.0
+
+## 📚 当前上下文
+- 模拟时间：${simulatedTime}
+${memories ? `- 用户偏好参考（自然了解即可，不要刻意提及）：\n${memories}` : ""}
+`;
 
   try {
     const response = await ai.models.generateContent({
-      model: 'gemini-3-flash-preview',
+      model: TEXT_MODEL,
       contents: [
         ...history.map(m => ({ role: m.role === 'assistant' ? 'model' : 'user', parts: [{ text: m.content }] })),
         { role: 'user', parts: [{ text: userInput }] }
       ],
       config: {
+        ...JSON_CONFIG,
         systemInstruction,
-        responseMimeType: "application/json",
       },
     });
 
-    return JSON.parse(response.text || '{"segments": ["呀吼~"], "stickerRequest": null, "personality_impact": {}}');
+    return parseJsonResponse<ChatResponse>(response.text, { segments: ['呀吼~'], stickerRequest: null, personality_impact: {} });
   } catch (error) {
     console.error("Chat Error:", error);
     return { segments: ["呜呜，信号不太好呢..."], stickerRequest: null, personality_impact: {} };
   }
 };
 
+// 各类贴纸的提示词模板，按类型直接查表
+const STICKER_PROMPTS: Record<StickerCache['type'], (detail: string) => string> = {
+  hikari_emotion: detail => `${CHARACTER_VISUAL_BASE} Expression: ${detail}. White background.`,
+  food_item: detail => `Kawaii watercolor food sticker: ${detail}, white background, soft shading.`,
+  landmark: detail => `Cute chibi landscape sticker: ${detail}, white background.`,
+  meme: detail => `Funny chibi reaction sticker, ${detail}, white background.`
+};
+
 export const generateSticker = async (request: { type: StickerCache['type'], detail: string }) => {
   // 首先尝试从缓存中查找相似的贴纸（降低阈值以提高复用率）
   const cached = await findSimilarSticker(request.type, request.detail, 0.7);
   if (cached) {
-    console.log('📦 使用缓存的贴纸:', cached.detail, '相似度匹配');
+    debugLog('📦 使用缓存的贴纸:', cached.detail, '相似度匹配');
     return cached.imageData;
   }
 
-  let finalPrompt = "";
-  if (request.type === "hikari_emotion") {
-    finalPrompt = `${CHARACTER_VISUAL_BASE} Expression: ${request.detail}. White background.`;
-  } else if (request.type === "food_item") {
-    finalPrompt = `Kawaii watercolor food sticker: ${request.detail}, white background, soft shading.`;
-  } else if (request.type === "landmark") {
-    finalPrompt = `Cute chibi landscape sticker: ${request.detail}, white background.`;
-  } else if (request.type === "meme") {
-    finalPrompt = `Funny chibi reaction sticker, ${request.detail}, white background.`;
-  } else {
-    return null;
-  }
+  const buildPrompt = STICKER_PROMPTS[request.type];
+  if (!buildPrompt) return null;
+  const finalPrompt = buildPrompt(request.detail);
 
   try {
-    console.log('🎨 生成新贴纸:', request.detail);
+    debugLog('🎨 生成新贴纸:', request.detail);
     const response = await ai.models.generateContent({
-      model: 'gemini-2.5-flash-image',
+      model: IMAGE_MODEL,
       contents: { parts: [{ text: finalPrompt }] },
       config: { imageConfig: { aspectRatio: "1:1" } },
     });
@@ -130,22 +138,19 @@ export const generateSticker = async (request: { type: StickerCache['type'], det
   }
 };
 
+// 只提取关系：调用方只用到 relationships，实体本身会出现在关系的两端，
+// 不必再让模型单独列出（减少输出 token）
 export const extractMemoriesFromInteraction = async (userMsg: string, assistantMsg: string, simulatedTime: string) => {
   const prompt = `
-从以下对话中提取实体和关系。
+从以下对话中提取实体之间的关系。
 对话内容：
 粉丝: ${userMsg}
 光: ${assistantMsg}
 
-识别：
-1. **实体**（人名、地名、事物、偏好、事件、情感等）
-2. **关系**（实体之间的关系和互动）
+识别实体（人名、地名、事物、偏好、事件、情感等）之间的关系和互动。
 
 输出 JSON 格式：
 {
-  "entities": [
-    {"name": "实体名", "type": "类型", "description": "描述"}
-  ],
   "relationships": [
     {"source": "源实体", "target": "目标实体", "type": "关系类型"}
   ]
@@ -154,12 +159,12 @@ export const extractMemoriesFromInteraction = async (userMsg: string, assistantM
 
   try {
     const response = await ai.models.generateContent({
-      model: 'gemini-3-flash-preview',
+      model: TEXT_MODEL,
       contents: prompt,
-      config: { responseMimeType: "application/json" }
+      config: JSON_CONFIG
     });
-    return JSON.parse(response.text || '{"entities": [], "relationships": []}');
+    return parseJsonResponse(response.text, { relationships: [] as { source: string; target: string; type: string }[] });
   } catch (error) {
-    return { entities: [], relationships: [] };
+    return { relationships: [] };
   }
 };
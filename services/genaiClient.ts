@@ -0,0 +1,14 @@
+import { GoogleGenAI } from '@google/genai';
+
+// 全局共享一个 Gemini 客户端，避免每个服务模块各自创建实例
+export const ai = new GoogleGenAI({ apiKey: import.meta.env.VITE_GEMINI_API_KEY || '' });
+
+// 模型名和请求配置统一定义，所有调用共用同一份
+export const TEXT_MODEL = 'gemini-3-flash-preview';
+export const IMAGE_MODEL = 'gemini-2.5-flash-image';
+export const JSON_CONFIG = { responseMimeType: 'application/json' };
+
+// 所有调用都开启了 JSON 模式，响应就是纯 JSON；空响应直接返回兜底对象，不必再解析一遍兜底字符串。
+// 结果类型由兜底对象决定，调用方写兜底值时就要把结构写完整
+export const parseJsonResponse = <T>(text: string | undefined, fallback: T): T =>
+  text ? JSON.parse(text) as T : fallback;
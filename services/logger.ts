@@ -0,0 +1,4 @@
+// 调试日志：只在开发环境输出，生产构建里是空函数，不占主线程
+export const debugLog: (...args: unknown[]) => void = import.meta.env.DEV
+  ? console.log.bind(console)
+  : () => {};
@@ -1,24 +1,38 @@
-import { MemoryFact, Relation } from '../types';
+import { MemoryFact, MemoryState, Relation } from '../types';
 
 const DB_NAME = 'HikariMemoryDB';
-const DB_VERSION = 1;
+const DB_VERSION = 2;
 const FACTS_STORE = 'facts';
 const RELATIONS_STORE = 'relations';
 
-let db: IDBDatabase | null = null;
+// 缓存打开中的连接 Promise，并发调用时只会打开一次数据库
+let dbPromise: Promise<IDBDatabase> | null = null;
 
 // 初始化 IndexedDB
 export const initMemoryDB = (): Promise<IDBDatabase> => {
-  return new Promise((resolve, reject) => {
-    if (db) return resolve(db);
+  if (dbPromise) return dbPromise;
 
+  dbPromise = new Promise((resolve, reject) => {
     const request = indexedDB.open(DB_NAME, DB_VERSION);
 
-    request.onerror = () => reject(request.error);
+    request.onerror = () => {
+      dbPromise = null;
+      reject(request.error);
+    };
     request.onsuccess = () => {
-      db = request.result;
+      const db = request.result;
+      // 其他标签页要升级数据库时主动关闭连接，下次访问重新打开，避免卡住对方
+      db.onversionchange = () => {
+        db.close();
+        dbPromise = null;
+      };
       resolve(db);
     };
+    // 旧版本连接还开在别的标签页时，升级会一直被阻塞；直接报错，不让缓存的 Promise 永远挂起
+    request.onblocked = () => {
+      dbPromise = null;
+      reject(new Error('记忆数据库升级被其他标签页阻塞，请关闭其他标签页后刷新'));
+    };
 
     request.onupgradeneeded = (event) => {
       const database = (event.target as IDBOpenDBRequest).result;
@@ -39,8 +53,16 @@ export const initMemoryDB = (): Promise<IDBDatabase> => {
         relationsStore.createIndex('target', 'target', { unique: false });
         relationsStore.createIndex('timestamp', 'timestamp', { unique: false });
       }
+
+      // v2：类型+时间复合索引，按类型查询时直接得到按时间排好序的结果
+      const factsStore = (event.target as IDBOpenDBRequest).transaction!.objectStore(FACTS_STORE);
+      if (!factsStore.indexNames.contains('type_timestamp')) {
+        factsStore.createIndex('type_timestamp', ['type', 'timestamp'], { unique: false });
+      }
     };
   });
+
+  return dbPromise;
 };
 
 // 添加记忆碎片
@@ -63,66 +85,68 @@ export const addMemoryFact = async (fact: Omit<MemoryFact, 'id' | 'timestamp'>):
   });
 };
 
-// 获取所有记忆碎片
-export const getAllMemoryFacts = async (): Promise<MemoryFact[]> => {
+// 批量添加记忆碎片（同一个事务内写入）
+export const addMemoryFacts = async (facts: Omit<MemoryFact, 'id' | 'timestamp'>[]): Promise<MemoryFact[]> => {
+  if (facts.length === 0) return [];
   const database = await initMemoryDB();
 
+  const timestamp = new Date().toISOString();
+  const newFacts: MemoryFact[] = facts.map(fact => ({
+    ...fact,
+    id: `fact-${Date.now()}-${Math.random().toString(36).substr(2, 9)}`,
+    timestamp
+  }));
+
   return new Promise((resolve, reject) => {
-    const transaction = database.transaction([FACTS_STORE], 'readonly');
+    const transaction = database.transaction([FACTS_STORE], 'readwrite');
     const store = transaction.objectStore(FACTS_STORE);
-    const request = store.getAll();
+    for (const fact of newFacts) {
+      store.add(fact);
+    }
 
-    request.onsuccess = () => {
-      const facts = request.result as MemoryFact[];
-      // 按时间倒序排列
-      resolve(facts.sort((a, b) =>
-        new Date(b.timestamp).getTime() - new Date(a.timestamp).getTime()
-      ));
-    };
-    request.onerror = () => reject(request.error);
+    transaction.oncomplete = () => resolve(newFacts);
+    transaction.onerror = () => reject(transaction.error);
   });
 };
 
-// 获取短期记忆
-export const getShortTermMemories = async (): Promise<MemoryFact[]> => {
+// 获取所有记忆碎片
+export const getAllMemoryFacts = async (): Promise<MemoryFact[]> => {
   const database = await initMemoryDB();
 
   return new Promise((resolve, reject) => {
     const transaction = database.transaction([FACTS_STORE], 'readonly');
     const store = transaction.objectStore(FACTS_STORE);
-    const index = store.index('type');
-    const request = index.getAll('short_term');
+    const request = store.index('timestamp').getAll();
 
     request.onsuccess = () => {
-      const facts = request.result as MemoryFact[];
-      resolve(facts.sort((a, b) =>
-        new Date(b.timestamp).getTime() - new Date(a.timestamp).getTime()
-      ));
+      // 索引按时间升序返回，反转即为倒序
+      resolve((request.result as MemoryFact[]).reverse());
     };
     request.onerror = () => reject(request.error);
   });
 };
 
-// 获取长期记忆
-export const getLongTermMemories = async (): Promise<MemoryFact[]> => {
+// 按类型读取记忆（时间倒序）
+const getMemoriesByType = async (type: MemoryFact['type']): Promise<MemoryFact[]> => {
   const database = await initMemoryDB();
 
   return new Promise((resolve, reject) => {
     const transaction = database.transaction([FACTS_STORE], 'readonly');
     const store = transaction.objectStore(FACTS_STORE);
-    const index = store.index('type');
-    const request = index.getAll('long_term');
+    const index = store.index('type_timestamp');
+    const request = index.getAll(IDBKeyRange.bound([type, ''], [type, '\uffff']));
 
-    request.onsuccess = () => {
-      const facts = request.result as MemoryFact[];
-      resolve(facts.sort((a, b) =>
-        new Date(b.timestamp).getTime() - new Date(a.timestamp).getTime()
-      ));
-    };
+    request.onsuccess = () => resolve((request.result as MemoryFact[]).reverse());
     request.onerror = () => reject(request.error);
   });
 };
 
+// 获取短期记忆
+export const getShortTermMemories = (): Promise<MemoryFact[]> => getMemoriesByType('short_term');
+
+// 获取长期记忆
+export const getLongTermMemories = (): Promise<MemoryFact[]> => getMemoriesByType('long_term');
+
 // 更新记忆类型（短期→长期）
 export const promoteToLongTerm = async (factId: string): Promise<void> => {
   const database = await initMemoryDB();
@@ -144,11 +168,29 @@ export const promoteToLongTerm = async (factId: string): Promise<void> => {
   });
 };
 
-// 批量提升到长期记忆
+// 批量提升到长期记忆（同一个事务内完成，不再逐条开事务）
 export const batchPromoteToLongTerm = async (factIds: string[]): Promise<void> => {
-  for (const id of factIds) {
-    await promoteToLongTerm(id);
-  }
+  if (factIds.length === 0) return;
+  const database = await initMemoryDB();
+
+  return new Promise((resolve, reject) => {
+    const transaction = database.transaction([FACTS_STORE], 'readwrite');
+    const store = transaction.objectStore(FACTS_STORE);
+
+    for (const id of factIds) {
+      const getRequest = store.get(id);
+      getRequest.onsuccess = () => {
+        const fact = getRequest.result as MemoryFact;
+        if (fact && fact.type === 'short_term') {
+          fact.type = 'long_term';
+          store.put(fact);
+        }
+      };
+    }
+
+    transaction.oncomplete = () => resolve();
+    transaction.onerror = () => reject(transaction.error);
+  });
 };
 
 // 更新记忆内容
@@ -186,6 +228,34 @@ export const deleteMemoryFact = async (factId: string): Promise<void> => {
   });
 };
 
+// 批量删除记忆碎片（同一个事务内完成）
+// 传入 onlyType 时先读出记录，只有类型仍然一致才删除：整理期间记忆可能已被另一次整理提升为长期记忆
+export const deleteMemoryFacts = async (factIds: string[], onlyType?: MemoryFact['type']): Promise<void> => {
+  if (factIds.length === 0) return;
+  const database = await initMemoryDB();
+
+  return new Promise((resolve, reject) => {
+    const transaction = database.transaction([FACTS_STORE], 'readwrite');
+    const store = transaction.objectStore(FACTS_STORE);
+    for (const id of factIds) {
+      if (!onlyType) {
+        store.delete(id);
+        continue;
+      }
+      const getRequest = store.get(id);
+      getRequest.onsuccess = () => {
+        const fact = getRequest.result as MemoryFact | undefined;
+        if (fact && fact.type === onlyType) {
+          store.delete(id);
+        }
+      };
+    }
+
+    transaction.oncomplete = () => resolve();
+    transaction.onerror = () => reject(transaction.error);
+  });
+};
+
 // 清空短期记忆（超过保留期限的）
 export const cleanupOldShortTermMemories = async (maxAgeHours = 48): Promise<void> => {
   const database = await initMemoryDB();
@@ -233,6 +303,53 @@ export const addRelation = async (relation: Omit<Relation, 'id' | 'timestamp'>):
   });
 };
 
+const isNonEmptyString = (value: unknown): value is string =>
+  typeof value === 'string' && value.trim().length > 0;
+
+// 两条关系的三元组是否相同
+const isSameRelation = (a: Omit<Relation, 'id' | 'timestamp'>, b: Omit<Relation, 'id' | 'timestamp'>) =>
+  a.source === b.source && a.predicate === b.predicate && a.target === b.target;
+
+// 批量添加羁绊关系（同一个事务内写入）
+// 每轮对话都会提取关系，同一条关系会被反复提取；已存在的三元组跳过，避免关系库无限增长
+export const addRelations = async (relations: Omit<Relation, 'id' | 'timestamp'>[]): Promise<Relation[]> => {
+  // 模型输出或旧版 localStorage 数据里可能有 null/对象，不是合法的索引键，
+  // 放进事务后 getAll 会同步抛错、导致整批只写了一半，所以先过滤掉
+  const validRelations = relations.filter(r =>
+    isNonEmptyString(r.source) && isNonEmptyString(r.predicate) && isNonEmptyString(r.target)
+  );
+  if (validRelations.length === 0) return [];
+  const database = await initMemoryDB();
+
+  const timestamp = new Date().toISOString();
+  const newRelations: Relation[] = validRelations.map(relation => ({
+    ...relation,
+    id: `rel-${Date.now()}-${Math.random().toString(36).substr(2, 9)}`,
+    timestamp
+  }));
+
+  return new Promise((resolve, reject) => {
+    const transaction = database.transaction([RELATIONS_STORE], 'readwrite');
+    const store = transaction.objectStore(RELATIONS_STORE);
+    const sourceIndex = store.index('source');
+    const added: Relation[] = [];
+
+    // 同一事务内的请求按顺序完成，added 也能拦住同一批里的重复关系
+    for (const relation of newRelations) {
+      const request = sourceIndex.getAll(relation.source);
+      request.onsuccess = () => {
+        const existing = request.result as Relation[];
+        if (existing.some(r => isSameRelation(r, relation)) || added.some(r => isSameRelation(r, relation))) return;
+        store.add(relation);
+        added.push(relation);
+      };
+    }
+
+    transaction.oncomplete = () => resolve(added);
+    transaction.onerror = () => reject(transaction.error);
+  });
+};
+
 // 获取所有羁绊关系
 export const getAllRelations = async (): Promise<Relation[]> => {
   const database = await initMemoryDB();
@@ -240,18 +357,31 @@ export const getAllRelations = async (): Promise<Relation[]> => {
   return new Promise((resolve, reject) => {
     const transaction = database.transaction([RELATIONS_STORE], 'readonly');
     const store = transaction.objectStore(RELATIONS_STORE);
-    const request = store.getAll();
+    const request = store.index('timestamp').getAll();
 
-    request.onsuccess = () => {
-      const relations = request.result as Relation[];
-      resolve(relations.sort((a, b) =>
-        new Date(b.timestamp).getTime() - new Date(a.timestamp).getTime()
-      ));
-    };
+    request.onsuccess = () => resolve((request.result as Relation[]).reverse());
     request.onerror = () => reject(request.error);
   });
 };
 
+// 一次读取全部记忆和羁绊（同一个只读事务，两个索引请求一起发出）
+export const loadMemoryState = async (): Promise<MemoryState> => {
+  const database = await initMemoryDB();
+
+  return new Promise((resolve, reject) => {
+    const transaction = database.transaction([FACTS_STORE, RELATIONS_STORE], 'readonly');
+    const factsRequest = transaction.objectStore(FACTS_STORE).index('timestamp').getAll();
+    const relationsRequest = transaction.objectStore(RELATIONS_STORE).index('timestamp').getAll();
+
+    // 索引按时间升序返回，反转即为倒序
+    transaction.oncomplete = () => resolve({
+      facts: (factsRequest.result as MemoryFact[]).reverse(),
+      relations: (relationsRequest.result as Relation[]).reverse()
+    });
+    transaction.onerror = () => reject(transaction.error);
+  });
+};
+
 // 删除羁绊关系
 export const deleteRelation = async (relationId: string): Promise<void> => {
   const database = await initMemoryDB();
@@ -275,20 +405,19 @@ export const migrateFromLocalStorage = async (): Promise<void> => {
     const oldData = JSON.parse(savedMemory) as { facts: MemoryFact[], relations: Relation[] };
 
     // 迁移记忆碎片
-    for (const fact of oldData.facts || []) {
+    const facts = oldData.facts || [];
+    for (const fact of facts) {
       // 如果没有 type 字段，默认为短期记忆
       if (!fact.type) {
         fact.type = 'short_term';
         fact.importance = 0.5;
         fact.source = 'system';
       }
-      await addMemoryFact(fact);
     }
 
-    // 迁移羁绊关系
-    for (const relation of oldData.relations || []) {
-      await addRelation(relation);
-    }
+    // 记忆和羁绊各用一个事务批量写入
+    await addMemoryFacts(facts);
+    await addRelations(oldData.relations || []);
 
     // 清除旧数据
     localStorage.removeItem('hikari_memory_v5');
@@ -298,18 +427,24 @@ export const migrateFromLocalStorage = async (): Promise<void> => {
 };
 
 // 获取记忆统计
+// 只需要数量，用 count() 在索引上计数，不读出记录本身
 export const getMemoryStats = async () => {
-  const [allFacts, shortTerm, longTerm, relations] = await Promise.all([
-    getAllMemoryFacts(),
-    getShortTermMemories(),
-    getLongTermMemories(),
-    getAllRelations()
-  ]);
-
-  return {
-    totalFacts: allFacts.length,
-    shortTermCount: shortTerm.length,
-    longTermCount: longTerm.length,
-    relationsCount: relations.length
-  };
+  const database = await initMemoryDB();
+
+  return new Promise<{ totalFacts: number; shortTermCount: number; longTermCount: number; relationsCount: number }>((resolve, reject) => {
+    const transaction = database.transaction([FACTS_STORE, RELATIONS_STORE], 'readonly');
+    const factsStore = transaction.objectStore(FACTS_STORE);
+    const totalRequest = factsStore.count();
+    const shortTermRequest = factsStore.index('type').count('short_term');
+    const longTermRequest = factsStore.index('type').count('long_term');
+    const relationsRequest = transaction.objectStore(RELATIONS_STORE).count();
+
+    transaction.oncomplete = () => resolve({
+      totalFacts: totalRequest.result,
+      shortTermCount: shortTermRequest.result,
+      longTermCount: longTermRequest.result,
+      relationsCount: relationsRequest.result
+    });
+    transaction.onerror = () => reject(transaction.error);
+  });
 };
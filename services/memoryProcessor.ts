@@ -1,43 +1,33 @@
-import { GoogleGenAI } from '@google/genai';
-import { addMemoryFact, addRelation, getShortTermMemories, promoteToLongTerm, batchPromoteToLongTerm, getLongTermMemories, deleteMemoryFact } from './memoryManager';
+import { ai, parseJsonResponse, TEXT_MODEL, JSON_CONFIG } from './genaiClient';
+import { addMemoryFacts, getAllMemoryFacts, getShortTermMemories, batchPromoteToLongTerm, getLongTermMemories, deleteMemoryFacts } from './memoryManager';
 import { MemoryFact } from '../types';
 import { summarizeLongTermMemories } from './topicGenerator';
+import { debugLog } from './logger';
 
-const ai = new GoogleGenAI({ apiKey: import.meta.env.VITE_GEMINI_API_KEY || '' });
+// 模型提取出的一条记忆（字段可能缺省，写入前补默认值）
+type ExtractedFact = { fact: string; category?: MemoryFact['category']; importance?: number };
 
 // 简单的去重检查（检查是否已有相似的记忆）
-const isDuplicateMemory = async (fact: string): Promise<boolean> => {
-  const shortTermMemories = await getShortTermMemories();
-  const longTermMemories = await getLongTermMemories();
-  const allMemories = [...shortTermMemories, ...longTermMemories];
-
+// 已有记忆由调用方读取一次后传入，避免每条新事实都重新读库
+const isDuplicateMemory = (fact: string, existingFacts: string[]): boolean => {
   // 检查是否有完全相同或高度相似的记忆
-  return allMemories.some(m => {
+  return existingFacts.some(existing => {
     // 完全相同
-    if (m.fact === fact) return true;
+    if (existing === fact) return true;
     // 包含关系（fact包含已存在的，或已存在的包含fact）
-    if (m.fact.includes(fact) || fact.includes(m.fact)) {
+    if (existing.includes(fact) || fact.includes(existing)) {
       // 只有当长度差异不大时才认为是重复
-      const lengthDiff = Math.abs(m.fact.length - fact.length);
+      const lengthDiff = Math.abs(existing.length - fact.length);
       return lengthDiff <= 3;
     }
     return false;
   });
 };
 
-// 记录对话到短期记忆
-export const recordConversationMemory = async (
-  userMessage: string,
-  assistantMessage: string,
-  simulatedTime: string
-): Promise<void> => {
-  const prompt = `你是一个记录助手。从对话中识别有用的信息。
+// 记录规则与分类在模块加载时拼好，每轮只插入对话内容
+const MEMORY_CATEGORIES: MemoryFact['category'][] = ['userinfo', 'hikari_info', 'shared_event'];
 
-对话：
-用户：${userMessage}
-光：${assistantMessage}
-
-【记录标准】记录以下类型：
+const RECORD_RULES = `【记录标准】记录以下类型：
 1. **偏好兴趣**：喜好、厌恶、兴趣、爱好（如"喜欢猫"、"讨厌香菜"）
 2. **生活习惯**：日常习惯、作息时间、工作学习（如"早上跑步"、"晚上熬夜"）
 3. **重要信息**：用户的基本信息、经历、家庭、朋友
@@ -58,7 +48,7 @@ export const recordConversationMemory = async (
   "facts": [
     {
       "fact": "具体的记忆内容",
-      "category": "userinfo|hikari_info|shared_event",
+      "category": "${MEMORY_CATEGORIES.join('|')}",
       "importance": 0.3-1.0
     }
   ]
@@ -66,48 +56,68 @@ export const recordConversationMemory = async (
 
 如果没有有价值的信息，返回 {"facts": []}`;
 
+// 记录对话到短期记忆（返回是否成功完成）
+export const recordConversationMemory = async (
+  userMessage: string,
+  assistantMessage: string,
+  simulatedTime: string
+): Promise<boolean> => {
+  const prompt = `你是一个记录助手。从对话中识别有用的信息。
+
+对话：
+用户：${userMessage}
+光：${assistantMessage}
+
+${RECORD_RULES}`;
+
   try {
     const response = await ai.models.generateContent({
-      model: 'gemini-3-flash-preview',
+      model: TEXT_MODEL,
       contents: prompt,
-      config: { responseMimeType: 'application/json' }
+      config: JSON_CONFIG
     });
 
-    const result = JSON.parse(response.text || '{"facts": []}');
+    const result = parseJsonResponse(response.text, { facts: [] as ExtractedFact[] });
 
     // 记录所有事实
     if (result.facts && result.facts.length > 0) {
-      let recordedCount = 0;
+      // 已有的短期和长期记忆只读一次；本次新增的也加入列表，同一批内部也能去重
+      const existingFacts = (await getAllMemoryFacts()).map(m => m.fact);
+      const newFacts: Omit<MemoryFact, 'id' | 'timestamp'>[] = [];
+
       for (const factData of result.facts) {
         if (!factData.fact) continue;
 
         // 检查是否重复
-        const isDuplicate = await isDuplicateMemory(factData.fact);
-        if (isDuplicate) {
-          console.log(`⚠️ 记忆已存在，跳过: ${factData.fact}`);
+        if (isDuplicateMemory(factData.fact, existingFacts)) {
+          debugLog(`⚠️ 记忆已存在，跳过: ${factData.fact}`);
           continue;
         }
 
-        await addMemoryFact({
+        existingFacts.push(factData.fact);
+        newFacts.push({
           fact: factData.fact,
           category: factData.category || 'shared_event',
           type: 'short_term',
           importance: factData.importance || 0.6,
           source: 'conversation'
         });
-        recordedCount++;
       }
 
+      const recordedCount = (await addMemoryFacts(newFacts)).length;
+
       if (recordedCount > 0) {
-        console.log(`📝 记录了 ${recordedCount} 条信息`);
+        debugLog(`📝 记录了 ${recordedCount} 条信息`);
       } else {
-        console.log('ℹ️ 本次对话无新信息需要记录');
+        debugLog('ℹ️ 本次对话无新信息需要记录');
       }
     } else {
-      console.log('ℹ️ 本次对话无重要信息');
+      debugLog('ℹ️ 本次对话无重要信息');
     }
+    return true;
   } catch (error) {
     console.error('记录记忆失败:', error);
+    return false;
   }
 };
 
@@ -136,35 +146,40 @@ ${shortTermMemories.map((m, i) => `${i + 1}. ${m.fact} (重要性: ${m.importanc
 
   try {
     const response = await ai.models.generateContent({
-      model: 'gemini-3-flash-preview',
+      model: TEXT_MODEL,
       contents: prompt,
-      config: { responseMimeType: 'application/json' }
+      config: JSON_CONFIG
     });
 
-    const result = JSON.parse(response.text || '{"keep_indices": [], "reason": ""}');
-    const keepIndices = new Set(result.keep_indices || []);
-
-    // 提升重要的短期记忆到长期记忆
-    let promoted = 0;
-    for (let i = 0; i < shortTermMemories.length; i++) {
-      if (keepIndices.has(i + 1)) {
-        await promoteToLongTerm(shortTermMemories[i].id);
-        promoted++;
-      }
-    }
+    // 空响应、格式不对或没有一个有效编号都按失败处理，走下面的保底逻辑，
+    // 否则会把所有短期记忆当成“未选中”全部删掉
+    if (!response.text) throw new Error('整理记忆返回为空');
+    const result = parseJsonResponse(response.text, { keep_indices: [] as unknown[], reason: '' });
+    if (!Array.isArray(result.keep_indices)) throw new Error('keep_indices 格式不正确');
+    // 模型可能把编号返回成字符串（["1","3"]），统一转成数字再比较
+    const keepIndices = new Set(
+      result.keep_indices
+        .map(Number)
+        .filter(n => Number.isInteger(n) && n >= 1 && n <= shortTermMemories.length)
+    );
+    if (keepIndices.size === 0) throw new Error('keep_indices 中没有有效编号');
+
+    const promoteIds: string[] = [];
+    const removeIds: string[] = [];
+    shortTermMemories.forEach((m, i) => {
+      (keepIndices.has(i + 1) ? promoteIds : removeIds).push(m.id);
+    });
 
-    // 删除未被选中的短期记忆
-    // 注意：这里需要在 memoryManager 中实现删除功能
-    const removed = shortTermMemories.length - promoted;
+    // 提升重要的短期记忆到长期记忆，删除未被选中的短期记忆
+    await batchPromoteToLongTerm(promoteIds);
+    await deleteMemoryFacts(removeIds, 'short_term');
 
-    return { promoted, removed };
+    return { promoted: promoteIds.length, removed: removeIds.length };
   } catch (error) {
     console.error('整理记忆失败:', error);
     // 失败时保留前40%
     const keepCount = Math.floor(shortTermMemories.length * 0.4);
-    for (let i = 0; i < keepCount; i++) {
-      await promoteToLongTerm(shortTermMemories[i].id);
-    }
+    await batchPromoteToLongTerm(shortTermMemories.slice(0, keepCount).map(m => m.id));
     return { promoted: keepCount, removed: shortTermMemories.length - keepCount };
   }
 };
@@ -184,19 +199,19 @@ export const organizeAndSummarizeLongTerm = async (): Promise<{ promoted: number
 
     // 删除原始的长期记忆（已经被总结替代）
     if (summarized > 0) {
-      for (const mem of longTermMemories) {
-        await deleteMemoryFact(mem.id);
-      }
+      await deleteMemoryFacts(longTermMemories.map(m => m.id), 'long_term');
     }
   }
 
   return { promoted, summarized };
 };
 
-// 检查是否需要记录记忆（每轮都记录）
-export const shouldRecordMemory = (conversationRounds: number): boolean => {
-  // 每轮都记录，去重逻辑在 recordConversationMemory 中处理
-  return true;
+// 检查是否需要记录记忆：“嗯”“好的”这类太短的回应，或和上一轮已记录的输入完全相同，
+// 不值得再调用两次模型；其余每轮都记录，去重逻辑在 recordConversationMemory 中处理。
+// 上一轮记录的输入由调用方保存（按会话区分，记录成功后才更新）
+export const shouldRecordMemory = (userMessage: string, lastRecordedInput = ''): boolean => {
+  const normalized = userMessage.trim();
+  return normalized.length >= 3 && normalized !== lastRecordedInput.trim();
 };
 
 // 检查是否需要整理记忆
@@ -210,7 +225,7 @@ export const extractMemoriesFromHistory = async (
   messages: Array<{ role: string; content: string; timestamp: string }>,
   simulatedTime: string
 ): Promise<{ count: number; memories: MemoryFact[] }> => {
-  if (messages.length === 0) return 0;
+  if (messages.length === 0) return { count: 0, memories: [] };
 
   // 将消息配对（用户+助手）
   // 更灵活的配对逻辑：找到用户消息，然后找下一个有文本的助手消息
@@ -236,11 +251,11 @@ export const extractMemoriesFromHistory = async (
   }
 
   if (conversationPairs.length === 0) {
-    console.log('没有找到有效的对话配对');
-    return 0;
+    debugLog('没有找到有效的对话配对');
+    return { count: 0, memories: [] };
   }
 
-  console.log(`找到 ${conversationPairs.length} 组对话配对`);
+  debugLog(`找到 ${conversationPairs.length} 组对话配对`);
 
   const prompt = `你是星野光的记忆整理助手。以下是${conversationPairs.length}组对话：
 
@@ -276,40 +291,35 @@ ${conversationPairs.map((pair, i) => `对话${i + 1}：
 }`;
 
   try {
-    console.log('🔍 开始从对话历史提取记忆...');
+    debugLog('🔍 开始从对话历史提取记忆...');
     const response = await ai.models.generateContent({
-      model: 'gemini-3-flash-preview',
+      model: TEXT_MODEL,
       contents: prompt,
-      config: { responseMimeType: 'application/json' }
+      config: JSON_CONFIG
     });
 
-    console.log('AI 响应:', response.text);
+    debugLog('AI 响应:', response.text);
 
-    const result = JSON.parse(response.text || '{"memories": []}');
+    const result = parseJsonResponse(response.text, { memories: [] as ExtractedFact[] });
     const memories = result.memories || [];
 
-    console.log(`解析得到 ${memories.length} 条记忆:`, memories);
+    debugLog(`解析得到 ${memories.length} 条记忆:`, memories);
 
     // 添加为长期记忆
-    let addedCount = 0;
-    const addedMemories: MemoryFact[] = [];
-    for (const mem of memories) {
-      if (mem.fact) {
-        const newMemory = await addMemoryFact({
+    const addedMemories = await addMemoryFacts(
+      memories
+        .filter(mem => mem.fact)
+        .map(mem => ({
           fact: mem.fact,
           category: mem.category || 'shared_event',
           type: 'long_term',
           importance: mem.importance || 0.7,
           source: 'system'
-        });
-        addedCount++;
-        addedMemories.push(newMemory);
-        console.log(`✅ 添加记忆: "${newMemory.fact}"`);
-      }
-    }
+        }))
+    );
 
-    console.log(`📝 从对话历史中提取了 ${addedCount} 条重要记忆`);
-    return { count: addedCount, memories: addedMemories };
+    debugLog(`📝 从对话历史中提取了 ${addedMemories.length} 条重要记忆`);
+    return { count: addedMemories.length, memories: addedMemories };
   } catch (error) {
     console.error('从历史提取记忆失败:', error);
     return { count: 0, memories: [] };
@@ -1,7 +1,5 @@
 import { OfflineEvent, OfflineEventSummary } from '../types';
-import { GoogleGenAI } from '@google/genai';
-
-const ai = new GoogleGenAI({ apiKey: import.meta.env.VITE_GEMINI_API_KEY || '' });
+import { ai, parseJsonResponse, TEXT_MODEL, JSON_CONFIG } from './genaiClient';
 
 // 光的日常活动模板
 const ACTIVITY_TEMPLATES = {
@@ -67,6 +65,13 @@ const getTimePassedDescription = (hours: number): string => {
   return `${days}天${remainingHours}小时`;
 };
 
+// 各时间档随机事件可以分布的时间范围（小时）
+const EVENT_WINDOW_HOURS: Record<'short' | 'medium' | 'long', number> = {
+  short: 6,
+  medium: 72,
+  long: 168
+};
+
 // 根据时间差选择模板
 const selectTemplates = (hours: number) => {
   if (hours < 6) return 'short';
@@ -77,21 +82,27 @@ const selectTemplates = (hours: number) => {
 // 生成随机事件
 const generateRandomEvents = (count: number, timeCategory: 'short' | 'medium' | 'long'): OfflineEvent[] => {
   const templates = ACTIVITY_TEMPLATES[timeCategory];
-  const events: OfflineEvent[] = [];
+  const now = Date.now();
+  const windowMs = EVENT_WINDOW_HOURS[timeCategory] * 60 * 60 * 1000;
 
+  // 先生成并排序毫秒时间戳，再格式化；不必在每次比较时把 ISO 字符串解析回 Date
+  const times: number[] = [];
   for (let i = 0; i < count; i++) {
+    times.push(now - Math.random() * windowMs);
+  }
+  times.sort((a, b) => a - b);
+
+  return times.map((time, i) => {
     const template = templates[Math.floor(Math.random() * templates.length)];
-    events.push({
-      id: `event-${Date.now()}-${i}`,
+    return {
+      id: `event-${now}-${i}`,
       type: template.type as any,
       title: template.title,
       description: '', // 后续用 AI 生成详细描述
-      timestamp: new Date(Date.now() - Math.random() * 1000 * 60 * 60 * (timeCategory === 'short' ? 6 : timeCategory === 'medium' ? 72 : 168)).toISOString(),
+      timestamp: new Date(time).toISOString(),
       emotion: template.emotion
-    });
-  }
-
-  return events.sort((a, b) => new Date(a.timestamp).getTime() - new Date(b.timestamp).getTime());
+    };
+  });
 };
 
 // 使用 AI 生成更丰富的离线事件
@@ -141,14 +152,14 @@ ${personalityStr}
 }`;
 
       const response = await ai.models.generateContent({
-        model: 'gemini-3-flash-preview',
+        model: TEXT_MODEL,
         contents: prompt,
-        config: { responseMimeType: 'application/json' }
+        config: JSON_CONFIG
       });
 
-      const aiResult = JSON.parse(response.text || '{"events": []}');
+      const aiResult = parseJsonResponse(response.text, { events: [] as Omit<OfflineEvent, 'id' | 'timestamp'>[] });
       if (aiResult.events && aiResult.events.length > 0) {
-        events = aiResult.events.map((e: any, idx: number) => ({
+        events = aiResult.events.map((e, idx) => ({
           id: `event-${Date.now()}-${idx}`,
           ...e,
           timestamp: new Date(Date.now() - Math.random() * timePassed * 3600000).toISOString()
@@ -174,24 +185,3 @@ ${personalityStr}
     mood
   };
 };
-
-// 检查是否应该触发离线事件
-export const shouldTriggerOfflineEvent = (
-  lastVisitTime: string | undefined,
-  minHours: number = 2
-): boolean => {
-  if (!lastVisitTime) return false;
-
-  const now = Date.now();
-  const last = new Date(lastVisitTime).getTime();
-  const hoursPassed = (now - last) / (1000 * 60 * 60);
-
-  return hoursPassed >= minHours;
-};
-
-// 计算时间差（小时）
-export const getTimeDifference = (lastVisitTime: string): number => {
-  const now = Date.now();
-  const last = new Date(lastVisitTime).getTime();
-  return (now - last) / (1000 * 60 * 60);
-};
@@ -0,0 +1,42 @@
+import { Personality } from '../types';
+
+// 光的基础性格，新会话和重置时都从这里开始（冻结，避免被意外修改）
+export const DEFAULT_PERSONALITY: Readonly<Personality> = Object.freeze({
+  cheerfulness: 0.8,
+  gentleness: 0.6,
+  energy: 0.9,
+  curiosity: 0.7,
+  empathy: 0.5
+});
+
+// 性格特质的固定顺序，遍历时只看这五项
+export const PERSONALITY_TRAITS: readonly (keyof Personality)[] = [
+  'cheerfulness',
+  'gentleness',
+  'energy',
+  'curiosity',
+  'empathy'
+];
+
+// 把模型返回的性格变化量叠加到当前性格上，结果限制在 [0, 1]
+// 模型多返回或拼错的字段直接忽略，不会污染性格状态
+// 没有任何特质真正变化时原样返回 current，React 据此跳过重渲染和会话自动保存
+export const applyPersonalityImpact = (
+  current: Personality,
+  impact?: Partial<Record<keyof Personality, number>>
+): Personality => {
+  if (!impact) return current;
+
+  let next: Personality | null = null;
+  for (const trait of PERSONALITY_TRAITS) {
+    const delta = impact[trait];
+    if (typeof delta !== 'number') continue;
+
+    const value = Math.max(0, Math.min(1, current[trait] + delta));
+    if (value !== current[trait]) {
+      next = next || { ...current };
+      next[trait] = value;
+    }
+  }
+  return next || current;
+};
@@ -1,23 +1,24 @@
 import { ChatSession, Message } from '../types';
+import { DEFAULT_PERSONALITY } from './personality';
 
 const DB_NAME = 'HikariChatSessions';
 const DB_VERSION = 1;
 const STORE_NAME = 'sessions';
 
-let db: IDBDatabase | null = null;
+let dbPromise: Promise<IDBDatabase> | null = null;
 
 // 初始化 IndexedDB
 export const initSessionDB = (): Promise<IDBDatabase> => {
-  return new Promise((resolve, reject) => {
-    if (db) return resolve(db);
+  if (dbPromise) return dbPromise;
 
+  dbPromise = new Promise((resolve, reject) => {
     const request = indexedDB.open(DB_NAME, DB_VERSION);
 
-    request.onerror = () => reject(request.error);
-    request.onsuccess = () => {
-      db = request.result;
-      resolve(db);
+    request.onerror = () => {
+      dbPromise = null;
+      reject(request.error);
     };
+    request.onsuccess = () => resolve(request.result);
 
     request.onupgradeneeded = (event) => {
       const database = (event.target as IDBOpenDBRequest).result;
@@ -28,6 +29,8 @@ export const initSessionDB = (): Promise<IDBDatabase> => {
       }
     };
   });
+
+  return dbPromise;
 };
 
 // 生成会话标题（基于第一条消息）
@@ -55,13 +58,7 @@ export const createSession = async (firstMessage?: Message): Promise<ChatSession
     createdAt: now,
     updatedAt: now,
     lastVisitTime: now, // 添加最后访问时间
-    personality: {
-      cheerfulness: 0.8,
-      gentleness: 0.6,
-      energy: 0.9,
-      curiosity: 0.7,
-      empathy: 0.5
-    }
+    personality: { ...DEFAULT_PERSONALITY }
   };
 
   return new Promise((resolve, reject) => {
@@ -81,14 +78,11 @@ export const getAllSessions = async (): Promise<ChatSession[]> => {
   return new Promise((resolve, reject) => {
     const transaction = database.transaction([STORE_NAME], 'readonly');
     const store = transaction.objectStore(STORE_NAME);
-    const request = store.getAll();
+    const request = store.index('updatedAt').getAll();
 
     request.onsuccess = () => {
-      const sessions = request.result as ChatSession[];
-      // 按更新时间倒序排列
-      resolve(sessions.sort((a, b) =>
-        new Date(b.updatedAt).getTime() - new Date(a.updatedAt).getTime()
-      ));
+      // 按更新时间倒序排列（索引为升序）
+      resolve((request.result as ChatSession[]).reverse());
     };
     request.onerror = () => reject(request.error);
   });
@@ -108,8 +102,8 @@ export const getSession = async (sessionId: string): Promise<ChatSession | null>
   });
 };
 
-// 更新会话
-export const updateSession = async (session: ChatSession): Promise<void> => {
+// 更新会话（updatedAt 总是在这里重新写入，调用方不必传）
+export const updateSession = async (session: Omit<ChatSession, 'updatedAt'> & { updatedAt?: string }): Promise<void> => {
   const database = await initSessionDB();
 
   // 更新标题（基于第一条用户消息）
@@ -4,20 +4,33 @@ const DB_NAME = 'HikariStickerCache';
 const DB_VERSION = 1;
 const STORE_NAME = 'stickers';
 
-let db: IDBDatabase | null = null;
+let dbPromise: Promise<IDBDatabase> | null = null;
+
+// 相似度查找只需要这几个字段；图片数据（base64，单张几百 KB）不常驻内存，命中后再按 id 读取
+type StickerIndexEntry = Pick<StickerCache, 'id' | 'detail' | 'embedding' | 'usageCount'>;
+
+const toIndexEntry = ({ id, detail, embedding, usageCount }: StickerCache): StickerIndexEntry =>
+  ({ id, detail, embedding, usageCount });
+
+// 按类型缓存的贴纸索引，避免每次查找都从 IndexedDB 读全量；写入/删除时失效
+const stickersByType = new Map<StickerCache['type'], StickerIndexEntry[]>();
+
+// 缓存内容版本号：新增/命中/删除/清空时递增，界面据此判断是否需要重新读取
+let cacheVersion = 0;
+export const getCacheVersion = (): number => cacheVersion;
 
 // 初始化 IndexedDB
 export const initDB = (): Promise<IDBDatabase> => {
-  return new Promise((resolve, reject) => {
-    if (db) return resolve(db);
+  if (dbPromise) return dbPromise;
 
+  dbPromise = new Promise((resolve, reject) => {
     const request = indexedDB.open(DB_NAME, DB_VERSION);
 
-    request.onerror = () => reject(request.error);
-    request.onsuccess = () => {
-      db = request.result;
-      resolve(db);
+    request.onerror = () => {
+      dbPromise = null;
+      reject(request.error);
     };
+    request.onsuccess = () => resolve(request.result);
 
     request.onupgradeneeded = (event) => {
       const database = (event.target as IDBOpenDBRequest).result;
@@ -30,26 +43,48 @@ export const initDB = (): Promise<IDBDatabase> => {
       }
     };
   });
+
+  return dbPromise;
 };
 
-// 计算简单的文本向量（TF-IDF 简化版）
+// 最近计算过的文本向量（按插入顺序淘汰），重复的贴纸描述不必重新计算
+const EMBEDDING_CACHE_SIZE = 200;
+const embeddingCache = new Map<string, number[]>();
+
 const computeTextEmbedding = (text: string): number[] => {
+  const cached = embeddingCache.get(text);
+  if (cached) {
+    // 重新插入，标记为最近使用
+    embeddingCache.delete(text);
+    embeddingCache.set(text, cached);
+    return cached;
+  }
+
+  const embedding = buildTextEmbedding(text);
+  embeddingCache.set(text, embedding);
+  if (embeddingCache.size > EMBEDDING_CACHE_SIZE) {
+    embeddingCache.delete(embeddingCache.keys().next().value!);
+  }
+  return embedding;
+};
+
+// 计算简单的文本向量（TF-IDF 简化版）
+const buildTextEmbedding = (text: string): number[] => {
   // 简单的字符级 n-gram 特征
   const n = 2; // 2-gram
   const features = new Map<string, number>();
+  const lower = text.toLowerCase(); // 只转换一次，不要在循环里重复分配
 
-  for (let i = 0; i <= text.length - n; i++) {
-    const gram = text.toLowerCase().substring(i, i + n);
+  for (let i = 0; i <= lower.length - n; i++) {
+    const gram = lower.substring(i, i + n);
     features.set(gram, (features.get(gram) || 0) + 1);
   }
 
   // 归一化为 256 维向量（简化版）
   const vector = new Array(256).fill(0);
-  let idx = 0;
   for (const [char, count] of features) {
     const hash = hashString(char);
     vector[hash % 256] += count;
-    idx++;
   }
 
   // L2 归一化
@@ -67,8 +102,13 @@ const hashString = (str: string): number => {
   return Math.abs(hash);
 };
 
+// 向量量化为 int8 存储：体积是 number[] 的 1/8 左右，扫描时读取的数据也更少。
+// 向量已 L2 归一化且分量非负，乘 127 取整即可；余弦相似度与缩放无关
+const quantizeEmbedding = (vector: number[]): Int8Array =>
+  Int8Array.from(vector, v => Math.round(v * 127));
+
 // 计算余弦相似度
-export const cosineSimilarity = (vec1: number[], vec2: number[]): number => {
+export const cosineSimilarity = (vec1: ArrayLike<number>, vec2: ArrayLike<number>): number => {
   if (vec1.length !== vec2.length) return 0;
 
   let dotProduct = 0;
@@ -96,7 +136,8 @@ export const saveSticker = async (
   imageData: string
 ): Promise<StickerCache> => {
   const database = await initDB();
-  const embedding = computeTextEmbedding(prompt + ' ' + detail);
+  // 保存时的文本（提示词+描述）之后不会再被查询，直接计算，不占查询向量的缓存位置
+  const embedding = quantizeEmbedding(buildTextEmbedding(prompt + ' ' + detail));
 
   const sticker: StickerCache = {
     id: `sticker-${Date.now()}-${Math.random().toString(36).substr(2, 9)}`,
@@ -114,7 +155,31 @@ export const saveSticker = async (
     const store = transaction.objectStore(STORE_NAME);
     const request = store.add(sticker);
 
-    request.onsuccess = () => resolve(sticker);
+    request.onsuccess = () => {
+      stickersByType.get(type)?.push(toIndexEntry(sticker));
+      cacheVersion++;
+      resolve(sticker);
+    };
+    request.onerror = () => reject(request.error);
+  });
+};
+
+// 读取某个类型的贴纸索引（优先走内存缓存）
+const getStickersByType = async (type: StickerCache['type']): Promise<StickerIndexEntry[]> => {
+  const cached = stickersByType.get(type);
+  if (cached) return cached;
+
+  const database = await initDB();
+  return new Promise((resolve, reject) => {
+    const transaction = database.transaction([STORE_NAME], 'readonly');
+    const store = transaction.objectStore(STORE_NAME);
+    const request = store.index('type').getAll(type);
+
+    request.onsuccess = () => {
+      const entries = (request.result as StickerCache[]).map(toIndexEntry);
+      stickersByType.set(type, entries);
+      resolve(entries);
+    };
     request.onerror = () => reject(request.error);
   });
 };
@@ -125,59 +190,58 @@ export const findSimilarSticker = async (
   detail: string,
   threshold = 0.85 // 相似度阈值
 ): Promise<StickerCache | null> => {
-  const database = await initDB();
-  const queryEmbedding = computeTextEmbedding(detail);
+  const stickers = await getStickersByType(type);
 
-  return new Promise((resolve, reject) => {
-    const transaction = database.transaction([STORE_NAME], 'readonly');
-    const store = transaction.objectStore(STORE_NAME);
-    const index = store.index('type');
-    const request = index.getAll(type);
+  // 描述完全相同的贴纸直接命中，不用计算向量和逐个比较相似度
+  let bestMatch: StickerIndexEntry | null = stickers.find(s => s.detail === detail) || null;
 
-    request.onsuccess = () => {
-      const stickers = request.result as StickerCache[];
-
-      // 找到最相似的贴纸
-      let bestMatch: StickerCache | null = null;
-      let bestSimilarity = 0;
-
-      for (const sticker of stickers) {
-        const similarity = cosineSimilarity(queryEmbedding, sticker.embedding);
-        if (similarity > bestSimilarity && similarity >= threshold) {
-          bestSimilarity = similarity;
-          bestMatch = sticker;
-        }
-      }
+  if (!bestMatch) {
+    // 找到最相似的贴纸
+    const queryEmbedding = computeTextEmbedding(detail);
+    let bestSimilarity = 0;
 
-      if (bestMatch) {
-        // 增加使用次数
-        updateUsageCount(bestMatch.id).catch(console.error);
+    for (const sticker of stickers) {
+      const similarity = cosineSimilarity(queryEmbedding, sticker.embedding);
+      if (similarity > bestSimilarity && similarity >= threshold) {
+        bestSimilarity = similarity;
+        bestMatch = sticker;
       }
+    }
+  }
 
-      resolve(bestMatch);
-    };
+  if (!bestMatch) return null;
 
-    request.onerror = () => reject(request.error);
-  });
+  const sticker = await loadStickerForUse(bestMatch.id);
+  if (sticker) {
+    // 同步更新缓存里的使用次数
+    bestMatch.usageCount = sticker.usageCount;
+    cacheVersion++;
+  } else {
+    // 记录已被删除（比如在其他标签页），丢掉这个类型的缓存，下次重新读取
+    stickersByType.delete(type);
+  }
+  return sticker;
 };
 
-// 更新使用次数
-const updateUsageCount = async (id: string): Promise<void> => {
+// 按 id 读取完整贴纸并增加使用次数（同一个读写事务）
+const loadStickerForUse = async (id: string): Promise<StickerCache | null> => {
   const database = await initDB();
   return new Promise((resolve, reject) => {
     const transaction = database.transaction([STORE_NAME], 'readwrite');
     const store = transaction.objectStore(STORE_NAME);
     const getReq = store.get(id);
+    let sticker: StickerCache | null = null;
 
     getReq.onsuccess = () => {
-      const sticker = getReq.result as StickerCache;
+      sticker = (getReq.result as StickerCache | undefined) ?? null;
       if (sticker) {
         sticker.usageCount++;
         store.put(sticker);
       }
-      resolve();
     };
-    getReq.onerror = () => reject(getReq.error);
+
+    transaction.oncomplete = () => resolve(sticker);
+    transaction.onerror = () => reject(transaction.error);
   });
 };
 
@@ -194,9 +258,14 @@ export const getAllCachedStickers = async (): Promise<StickerCache[]> => {
   });
 };
 
+// 按使用次数降序排列（返回新数组）
+export const sortByUsage = (stickers: StickerCache[]): StickerCache[] =>
+  [...stickers].sort((a, b) => b.usageCount - a.usageCount);
+
 // 获取缓存统计
-export const getCacheStats = async (): Promise<StickerCacheStats> => {
-  const stickers = await getAllCachedStickers();
+// 调用方已经读过并按使用次数排好序时直接传进来，省掉一次 IndexedDB 全表读取和重复排序
+export const getCacheStats = async (sortedByUsage?: StickerCache[]): Promise<StickerCacheStats> => {
+  const stickers = sortedByUsage ?? sortByUsage(await getAllCachedStickers());
 
   // 计算总大小（大约）
   let totalSize = 0;
@@ -204,16 +273,11 @@ export const getCacheStats = async (): Promise<StickerCacheStats> => {
     totalSize += sticker.imageData.length * 2; // base64 大约是原始的 4/3，UTF-16 每字符 2 字节
   }
 
-  // 获取使用最多的贴纸
-  const mostUsed = [...stickers]
-    .sort((a, b) => b.usageCount - a.usageCount)
-    .slice(0, 10);
-
   return {
     totalCached: stickers.length,
     totalSize,
     hitRate: 0, // 需要在运行时追踪
-    mostUsed
+    mostUsed: stickers.slice(0, 10) // 使用最多的贴纸
   };
 };
 
@@ -225,7 +289,11 @@ export const deleteSticker = async (id: string): Promise<void> => {
     const store = transaction.objectStore(STORE_NAME);
     const request = store.delete(id);
 
-    request.onsuccess = () => resolve();
+    request.onsuccess = () => {
+      stickersByType.clear();
+      cacheVersion++;
+      resolve();
+    };
     request.onerror = () => reject(request.error);
   });
 };
@@ -238,7 +306,11 @@ export const clearAllCache = async (): Promise<void> => {
     const store = transaction.objectStore(STORE_NAME);
     const request = store.clear();
 
-    request.onsuccess = () => resolve();
+    request.onsuccess = () => {
+      stickersByType.clear();
+      cacheVersion++;
+      resolve();
+    };
     request.onerror = () => reject(request.error);
   });
 };
@@ -0,0 +1,17 @@
+// 离线时长判断：切换会话时同步调用，单独成模块，不必为此加载离线事件生成逻辑
+
+// 计算时间差（小时）
+export const getTimeDifference = (lastVisitTime: string): number => {
+  const now = Date.now();
+  const last = new Date(lastVisitTime).getTime();
+  return (now - last) / (1000 * 60 * 60);
+};
+
+// 检查是否应该触发离线事件
+export const shouldTriggerOfflineEvent = (
+  lastVisitTime: string | undefined,
+  minHours: number = 2
+): boolean => {
+  if (!lastVisitTime) return false;
+  return getTimeDifference(lastVisitTime) >= minHours;
+};
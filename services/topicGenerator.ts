@@ -1,9 +1,8 @@
-import { GoogleGenAI } from '@google/genai';
+import { ai, parseJsonResponse, TEXT_MODEL, JSON_CONFIG } from './genaiClient';
 import { getAllMemoryFacts, getLongTermMemories } from './memoryManager';
 import { MemoryFact } from '../types';
-import { addMemoryFact } from './memoryManager';
-
-const ai = new GoogleGenAI({ apiKey: import.meta.env.VITE_GEMINI_API_KEY || '' });
+import { addMemoryFacts } from './memoryManager';
+import { debugLog } from './logger';
 
 // 生成开场白或主动话题
 export const generateOpeningTopic = async (
@@ -41,12 +40,12 @@ ${personalityStr}
 
   try {
     const response = await ai.models.generateContent({
-      model: 'gemini-3-flash-preview',
+      model: TEXT_MODEL,
       contents: prompt,
-      config: { responseMimeType: 'application/json' }
+      config: JSON_CONFIG
     });
 
-    const result = JSON.parse(response.text || '{"topic": "呀吼！今天也是元气满满的一天呢~★", "suggestAsMessage": true}');
+    const result = parseJsonResponse(response.text, { topic: '呀吼！今天也是元气满满的一天呢~★', suggestAsMessage: true });
     return result;
   } catch (error) {
     console.error('生成话题失败:', error);
@@ -84,26 +83,24 @@ ${longTermMemories.map((m, i) => `${i + 1}. ${m.fact}`).join('\n')}
 
   try {
     const response = await ai.models.generateContent({
-      model: 'gemini-3-flash-preview',
+      model: TEXT_MODEL,
       contents: prompt,
-      config: { responseMimeType: 'application/json' }
+      config: JSON_CONFIG
     });
 
-    const result = JSON.parse(response.text || '{"summaries": []}');
+    const result = parseJsonResponse(response.text, { summaries: [] as string[] });
     const summaries = result.summaries || [];
 
     // 保存总结后的记忆为新的长期记忆
-    for (const summary of summaries) {
-      await addMemoryFact({
-        fact: summary,
-        category: 'shared_event',
-        type: 'long_term',
-        importance: 0.8,
-        source: 'system'
-      });
-    }
-
-    console.log(`📝 总结了 ${summaries.length} 条核心记忆`);
+    await addMemoryFacts(summaries.map(summary => ({
+      fact: summary,
+      category: 'shared_event',
+      type: 'long_term',
+      importance: 0.8,
+      source: 'system'
+    })));
+
+    debugLog(`📝 总结了 ${summaries.length} 条核心记忆`);
     return { summarized: summaries.length, summaries };
   } catch (error) {
     console.error('总结记忆失败:', error);
@@ -37,7 +37,7 @@ export interface StickerCache {
   type: 'hikari_emotion' | 'food_item' | 'landmark' | 'meme';
   detail: string;
   imageData: string; // base64 image data
-  embedding: number[]; // text embedding vector for similarity search
+  embedding: number[] | Int8Array; // text embedding vector for similarity search (int8 quantized; older entries are number[])
   createdAt: string;
   usageCount: number;
 }
@@ -49,6 +49,14 @@ export interface StickerCacheStats {
   mostUsed: StickerCache[];
 }
 
+export interface Personality {
+  cheerfulness: number;
+  gentleness: number;
+  energy: number;
+  curiosity: number;
+  empathy: number;
+}
+
 export interface ChatSession {
   id: string;
   title: string;
@@ -56,13 +64,7 @@ export interface ChatSession {
   createdAt: string;
   updatedAt: string;
   lastVisitTime?: string; // 上次访问时间
-  personality: {
-    cheerfulness: number;
-    gentleness: number;
-    energy: number;
-    curiosity: number;
-    empathy: number;
-  };
+  personality: Personality;
 }
 
 export interface OfflineEvent {
@@ -1,5 +1,6 @@
 interface ImportMetaEnv {
   readonly VITE_GEMINI_API_KEY: string;
+  readonly DEV: boolean;
 }
 
 interface ImportMeta {